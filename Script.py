@@ -76,14 +76,17 @@ Just try my commands"""
 /stats - to get bot status
 /delete - to delete files using query
 /delete_all - to delete all indexed file
+/warm_bin - to pre-copy most requested files to bin channel
+/pipeline - to see group message pipeline timings
+/search_stats - top / zero-hit queries and tier hit ratios
 /broadcast - to send message to all bot users
 /grp_broadcast - to send message to all groups
 /pin_broadcast - to send message as pin to all bot users.
 /pin_grp_broadcast - to send message as pin to all groups.
 /restart - to restart bot
 /leave - to leave your bot from particular group
-/users - to get all users details
-/chats - to get all groups
+/users [csv|jsonl] - export all users (gzip)
+/chats [csv|jsonl] - export all groups (gzip)
 /invite_link - to generate invite link
 /index - to index bot accessible channels
 /add_prm - to add new premium user
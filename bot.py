@@ -33,6 +33,7 @@ from aiohttp import web
 from hydrogram import Client, types
 from hydrogram.errors import FloodWait
 from web import web_app
+from web.utils.clients import initialize_clients, stop_clients
 from info import (
     API_ID,
     API_HASH,
@@ -46,7 +47,7 @@ from info import (
     DATABASE_URL,
     DATABASE_NAME
 )
-from utils import temp, get_readable_time
+from utils import temp, get_readable_time, notifier, notify, deleter, watch_settings, reconcile_counters
 from database.users_chats_db import db
 from pymongo import MongoClient
 
@@ -56,6 +57,8 @@ import pytz
 
 # -------------------- IMPORT PREMIUM MODULE --------------------
 from plugins.premium import check_premium_expired
+from plugins.broadcast import resume_broadcasts
+from database.analytics import analytics
 
 # ==========================================================
 # BOT CLASS
@@ -76,8 +79,8 @@ class Bot(Client):
 
         # Load banned users & chats
         b_users, b_chats = await db.get_banned()
-        temp.BANNED_USERS = b_users
-        temp.BANNED_CHATS = b_chats
+        temp.BANNED_USERS = set(b_users)
+        temp.BANNED_CHATS = set(b_chats)
 
         # Restart message handling
         if os.path.exists("restart.txt"):
@@ -100,11 +103,32 @@ class Bot(Client):
         temp.U_NAME = me.username
         temp.B_NAME = me.first_name
 
+        # Streaming client pool (main bot + MULTI_TOKENS)
+        await initialize_clients(self)
+
         # Web server (health / stream)
         runner = web.AppRunner(web_app, access_log=None)
         await runner.setup()
         await web.TCPSite(runner, "0.0.0.0", PORT).start()
 
+        # Outbound notification queue
+        await notifier.start(self)
+
+        # Scheduled message deletions (restored from Mongo)
+        await deleter.start(self)
+
+        # Search analytics write-behind
+        asyncio.create_task(analytics.run())
+
+        # /stats counters repair
+        asyncio.create_task(reconcile_counters())
+
+        # Cross-process settings invalidation (optional)
+        asyncio.create_task(watch_settings())
+
+        # Broadcasts interrupted by a restart
+        asyncio.create_task(resume_broadcasts(self))
+
         # Premium expiry checker
         asyncio.create_task(check_premium_expired(self))
 
@@ -125,11 +149,7 @@ class Bot(Client):
 
         # Notify admins
         for admin_id in ADMINS:
-            try:
-                await self.send_message(admin_id, startup_msg)
-                logger.info(f"Startup notification sent to admin: {admin_id}")
-            except Exception as e:
-                logger.error(f"Failed to send startup notification to {admin_id}: {e}")
+            notify(admin_id, startup_msg)
 
         # Log channel
         try:
@@ -144,6 +164,8 @@ class Bot(Client):
         logger.info(f"@{me.username} started successfully")
 
     async def stop(self, *args):
+        await analytics.flush()
+        await stop_clients()
         await super().stop()
         logger.info("Bot stopped. Bye 👋")
 
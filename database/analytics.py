@@ -0,0 +1,130 @@
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from collections import Counter, defaultdict
+from pymongo import UpdateOne, ASCENDING
+
+from info import DATABASE_NAME, ANALYTICS_EXPIRE
+from database.users_chats_db import client, db
+
+logger = logging.getLogger(__name__)
+
+_db = client[DATABASE_NAME]
+
+TIERS = ("primary", "cloud", "archive", "prefix", "none")
+
+
+# ─────────────────────────────────────────────
+# 📈 SEARCH ANALYTICS (WRITE-BEHIND)
+# ─────────────────────────────────────────────
+class SearchAnalytics:
+    """
+    Search events are only counted in memory on the hot path and rolled
+    up per minute; every FLUSH_EVERY seconds the rollups are written with
+    one bulk_write per collection from a worker thread.
+
+    SearchMinutes: {_id: minute, searches, zero, tiers.<tier>, origin.<pm|group>}
+    SearchQueries: {_id: "<minute>|<query>", minute, query, searches, zero}
+    Both expire after ANALYTICS_EXPIRE.
+    """
+    FLUSH_EVERY = 10
+    MAX_QUERIES = 50000  # distinct queries buffered per flush, totals are always kept
+
+    def __init__(self):
+        self.minutes = _db.SearchMinutes
+        self.queries = _db.SearchQueries
+        self.minute_counts = defaultdict(Counter)
+        self.query_counts = defaultdict(Counter)
+        db.run_step("SearchMinutes ttl", db.ensure_ttl_index, self.minutes, "minute", ANALYTICS_EXPIRE)
+        db.run_step("SearchQueries ttl", db.ensure_ttl_index, self.queries, "minute", ANALYTICS_EXPIRE)
+        db.run_step(
+            "SearchQueries index", self.queries.create_index,
+            [("minute", ASCENDING), ("query", ASCENDING)]
+        )
+
+    @staticmethod
+    def _minute():
+        return datetime.utcnow().replace(second=0, microsecond=0)
+
+    def record_search(self, query, tier, total, origin):
+        """Called once per user search by auto_filter (pm or group)"""
+        minute = self._minute()
+        counts = self.minute_counts[minute]
+        counts["searches"] += 1
+        counts[f"tiers.{tier}"] += 1
+        counts[f"origin.{origin}"] += 1
+        if not total:
+            counts["zero"] += 1
+
+        key = (minute, query[:64])
+        if key in self.query_counts or len(self.query_counts) < self.MAX_QUERIES:
+            q = self.query_counts[key]
+            q["searches"] += 1
+            if not total:
+                q["zero"] += 1
+
+    # ───────── FLUSH ─────────
+    def write(self, minute_counts, query_counts):
+        if minute_counts:
+            self.minutes.bulk_write([
+                UpdateOne({"_id": minute}, {"$inc": dict(counts), "$setOnInsert": {"minute": minute}}, upsert=True)
+                for minute, counts in minute_counts.items()
+            ], ordered=False)
+        if query_counts:
+            self.queries.bulk_write([
+                UpdateOne(
+                    {"_id": f"{minute:%Y%m%d%H%M}|{query}"},
+                    {"$inc": dict(counts), "$setOnInsert": {"minute": minute, "query": query}},
+                    upsert=True
+                )
+                for (minute, query), counts in query_counts.items()
+            ], ordered=False)
+
+    async def flush(self):
+        # swap the buffers on the loop thread, write them in a worker
+        minute_counts, self.minute_counts = self.minute_counts, defaultdict(Counter)
+        query_counts, self.query_counts = self.query_counts, defaultdict(Counter)
+        try:
+            await asyncio.to_thread(self.write, minute_counts, query_counts)
+        except Exception as e:
+            logger.error(f"Analytics flush failed: {e}")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.FLUSH_EVERY)
+            await self.flush()
+
+    # ───────── REPORTS ─────────
+    def report(self, hours=24, limit=10):
+        """Totals, tier/origin split, top and zero-hit queries (slow, run in a thread)"""
+        since = datetime.utcnow() - timedelta(hours=hours)
+        started = time.perf_counter()
+
+        totals = Counter()
+        for doc in self.minutes.find({"minute": {"$gte": since}}, {"_id": 0, "minute": 0}):
+            for key, value in doc.items():
+                if isinstance(value, dict):
+                    for sub, n in value.items():
+                        totals[f"{key}.{sub}"] += n
+                else:
+                    totals[key] += value
+
+        def top(field):
+            return list(self.queries.aggregate([
+                {"$match": {"minute": {"$gte": since}}},
+                {"$group": {"_id": "$query", "n": {"$sum": f"${field}"}}},
+                {"$match": {"n": {"$gt": 0}}},
+                {"$sort": {"n": -1}},
+                {"$limit": limit}
+            ]))
+
+        return {
+            "totals": totals,
+            "top": top("searches"),
+            "zero": top("zero"),
+            "took": time.perf_counter() - started
+        }
+
+
+analytics = SearchAnalytics()
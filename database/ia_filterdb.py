@@ -8,6 +8,7 @@ from pymongo import MongoClient, TEXT
 from pymongo.errors import DuplicateKeyError
 
 from info import USE_CAPTION_FILTER, DATABASE_URL, DATABASE_NAME, MAX_BTN
+from database.users_chats_db import db as users_db
 
 logger = logging.getLogger(__name__)
 
@@ -110,9 +111,15 @@ async def save_file(media, collection_type="primary"):
             "file_size": media.file_size
         }
 
-        col = COLLECTIONS.get(collection_type, primary)
+        if collection_type not in COLLECTIONS:
+            collection_type = "primary"
+        col = COLLECTIONS[collection_type]
 
         col.insert_one(doc)
+        users_db.bump_counters({
+            f"files.{collection_type}": 1,
+            f"size.{collection_type}": media.file_size or 0
+        })
         # Silent - no logs for file save
         return "suc"
     except DuplicateKeyError:
@@ -166,7 +173,8 @@ async def get_search_results(
     max_results=MAX_BTN,
     offset=0,
     lang=None,
-    collection_type="primary"
+    collection_type="primary",
+    meta=None
 ):
     """
     Main search function with intelligent cascade
@@ -177,21 +185,25 @@ async def get_search_results(
         offset: Pagination offset
         lang: Language filter (optional)
         collection_type: "primary", "cloud", "archive", or "all"
+        meta: Optional dict, filled with the normalized "query" and the
+              answering "tier" (collection name, "prefix" or "none")
     
     Returns:
-        (results, next_offset, total)
+        (results, next_offset, total, actual_source)
     """
     if not query or not query.strip():
-        return [], "", 0
+        return [], "", 0, collection_type
     
     query = normalize_query(query)
     if not query:
-        return [], "", 0
+        return [], "", 0, collection_type
     
     prefix = prefix_query(query)
 
     results = []
     total = 0
+    source = None  # collection the results came from
+    tier = "none"  # analytics: collection name or "prefix"
 
     # ⚡ CASCADE SEARCH: Primary → Cloud → Archive
     # Only searches next collection if previous returns 0 results
@@ -200,34 +212,35 @@ async def get_search_results(
         docs, cnt = _search(primary, query, offset, max_results)
         results.extend(docs)
         total += cnt
+        if docs:
+            source = tier = "primary"
         
         # 2️⃣ If Primary has 0 results, try Cloud
         if not results:
             docs, cnt = _search(cloud, query, offset, max_results)
             results.extend(docs)
             total += cnt
+            if docs:
+                source = tier = "cloud"
             
             # 3️⃣ If Cloud also has 0 results, try Archive
             if not results:
                 docs, cnt = _search(archive, query, offset, max_results)
                 results.extend(docs)
                 total += cnt
+                if docs:
+                    source = tier = "archive"
                 
                 # 4️⃣ If still no results, try prefix fallback in all collections
                 if not results and prefix:
-                    docs, cnt = _search(primary, prefix, 0, max_results)
-                    if docs:
-                        results.extend(docs)
-                        total += cnt
-                    else:
-                        docs, cnt = _search(cloud, prefix, 0, max_results)
-                        if docs:
-                            results.extend(docs)
-                            total += cnt
-                        else:
-                            docs, cnt = _search(archive, prefix, 0, max_results)
+                    for name, col in COLLECTIONS.items():
+                        docs, cnt = _search(col, prefix, 0, max_results)
+                        if docs or name == "archive":
                             results.extend(docs)
                             total += cnt
+                        if docs:
+                            source, tier = name, "prefix"
+                            break
     
     # Single collection search (old behavior)
     elif collection_type in COLLECTIONS:
@@ -237,18 +250,24 @@ async def get_search_results(
         docs, cnt = _search(col, query, offset, max_results)
         results.extend(docs)
         total += cnt
+        if docs:
+            tier = collection_type
         
         # Prefix fallback if no results
         if not results and prefix:
             docs, cnt = _search(col, prefix, 0, max_results)
             results.extend(docs)
             total += cnt
+            if docs:
+                tier = "prefix"
     
     else:
         # Invalid collection type, default to primary
         docs, cnt = _search(primary, query, offset, max_results)
         results.extend(docs)
         total += cnt
+        if docs:
+            tier = "primary"
 
     # 5️⃣ LANG FILTER (VERY SMALL LOOP)
     if lang and results:
@@ -261,19 +280,14 @@ async def get_search_results(
     if next_offset >= total:
         next_offset = ""
 
+    if meta is not None:
+        meta["query"] = query
+        meta["tier"] = tier
+
     # ✅ Return which collection actually had results
     actual_source = collection_type
     if collection_type == "all" and results:
-        # Detect which collection the results came from
-        if total > 0:
-            # Check first result's _id in each collection to find source
-            first_id = results[0]["_id"]
-            if primary.find_one({"_id": first_id}):
-                actual_source = "primary"
-            elif cloud.find_one({"_id": first_id}):
-                actual_source = "cloud"
-            elif archive.find_one({"_id": first_id}):
-                actual_source = "archive"
+        actual_source = source
 
     return results, next_offset, total, actual_source
 
@@ -301,6 +315,7 @@ async def delete_files(query, collection_type="all"):
                     continue
                 result = col.delete_many({})
                 deleted += result.deleted_count
+                users_db.set_counters({f"files.{name}": 0, f"size.{name}": 0})
                 logger.warning(f"⚠️ DELETED ALL {result.deleted_count} files from {name}")
             return deleted
         
@@ -315,8 +330,14 @@ async def delete_files(query, collection_type="all"):
         for name, col in COLLECTIONS.items():
             if collection_type != "all" and name != collection_type:
                 continue
+            size = _total_size(col, flt)
             result = col.delete_many(flt)
             deleted += result.deleted_count
+            if result.deleted_count:
+                users_db.bump_counters({
+                    f"files.{name}": -result.deleted_count,
+                    f"size.{name}": -size
+                })
             if result.deleted_count > 0:
                 # ✅ DELETE LOG - Shows in Koyeb
                 logger.info(f"🗑️ Deleted {result.deleted_count} files matching '{query}' from {name}")
@@ -379,17 +400,32 @@ async def move_files(query, from_collection, to_collection):
             return 0
 
         moved = 0
+        inserted = 0
+        inserted_size = 0
+        moved_size = 0
         for doc in src.find(_text_filter(query)):
             try:
                 dst.insert_one(doc)
                 src.delete_one({"_id": doc["_id"]})
                 moved += 1
+                inserted += 1
+                inserted_size += doc.get("file_size") or 0
+                moved_size += doc.get("file_size") or 0
             except DuplicateKeyError:
                 src.delete_one({"_id": doc["_id"]})
                 moved += 1
+                moved_size += doc.get("file_size") or 0
             except Exception as e:
                 logger.error(f"Error moving file {doc['_id']}: {e}")
 
+        if moved:
+            users_db.bump_counters({
+                f"files.{from_collection}": -moved,
+                f"size.{from_collection}": -moved_size,
+                f"files.{to_collection}": inserted,
+                f"size.{to_collection}": inserted_size
+            })
+
         # ✅ MOVE LOG - Shows in Koyeb
         if moved > 0:
             logger.info(f"📦 Moved {moved} files from {from_collection} → {to_collection}")
@@ -457,28 +493,35 @@ async def search_by_filename(filename, collection_type="primary"):
 # ─────────────────────────────────────────
 # 📊 GET COLLECTION STATS
 # ─────────────────────────────────────────
+def _total_size(col, flt=None):
+    """Sum of file_size over matching files (full scan, keep off hot paths)"""
+    pipeline = [{"$group": {"_id": None, "total_size": {"$sum": "$file_size"}}}]
+    if flt:
+        pipeline.insert(0, {"$match": flt})
+    result = list(col.aggregate(pipeline))
+    return result[0]["total_size"] if result else 0
+
+def recount_files():
+    """Exact file counts and sizes for the counters reconcile (slow, run in a thread)"""
+    counts = {}
+    for name, col in COLLECTIONS.items():
+        counts[f"files.{name}"] = col.count_documents({})
+        counts[f"size.{name}"] = _total_size(col)
+    return counts
+
 async def get_collection_stats(collection_type="primary"):
     """
-    Get detailed stats for a collection
+    Get detailed stats for a collection (from the counters document)
     
     Returns:
         Dictionary with stats
     """
     try:
-        col = COLLECTIONS.get(collection_type, primary)
-        total = col.estimated_document_count()
-        
-        # Get total size
-        pipeline = [
-            {"$group": {"_id": None, "total_size": {"$sum": "$file_size"}}}
-        ]
-        result = list(col.aggregate(pipeline))
-        total_size = result[0]["total_size"] if result else 0
-        
+        counters = users_db.get_counters()
         return {
             "collection": collection_type,
-            "total_files": total,
-            "total_size": total_size
+            "total_files": counters.get("files", {}).get(collection_type, 0),
+            "total_size": counters.get("size", {}).get(collection_type, 0)
         }
     except Exception as e:
         logger.error(f"Error getting collection stats: {e}")
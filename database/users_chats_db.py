@@ -1,4 +1,7 @@
-from pymongo import MongoClient
+import logging
+from datetime import datetime
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne, ReturnDocument
+from pymongo.errors import OperationFailure
 
 from info import (
     BOT_ID,
@@ -9,9 +12,13 @@ from info import (
     WELCOME_TEXT,
     SPELL_CHECK,
     PROTECT_CONTENT,
-    AUTO_DELETE
+    AUTO_DELETE,
+    WARN_EXPIRE,
+    SEARCH_KEY_EXPIRE
 )
 
+logger = logging.getLogger(__name__)
+
 # ─────────────────────────────────────────────
 # 🔌 SINGLE DATABASE CONNECTION
 # ─────────────────────────────────────────────
@@ -42,7 +49,7 @@ class Database:
 
     # ✅ Enhanced default premium settings (synced with Premium.py)
     default_prm = {
-        "expire": "",
+        "expire": None,
         "trial": False,
         "plan": "",
         "premium": False,
@@ -57,6 +64,154 @@ class Database:
         self.premium = _db.Premiums
         self.connections = _db.Connections
         self.settings = _db.Settings
+        self.bin_copies = _db.BinCopies
+        self.notifications = _db.Notifications
+        self.deletions = _db.Deletions
+        self.warns = _db.Warns
+        self.search_keys = _db.SearchKeys
+        self.broadcasts = _db.Broadcasts
+        self.counters = _db.Counters
+        self.migrations = _db.Migrations
+        # per chat group features, one document per (chat_id, name)
+        self.items = {
+            "filters": _db.Filters,
+            "notes": _db.Notes,
+            "blacklist": _db.Blacklist,
+            "dlink": _db.Dlinks
+        }
+        # called with user_id after every plan write (cache invalidation etc.)
+        self.plan_listeners = []
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        """Each step guarded on its own, so one failure can't skip the rest"""
+        self.run_step("bin_copies index", self.bin_copies.create_index, [("requests", DESCENDING)])
+        self.run_step("notifications index", self.notifications.create_index, "next_try")
+        self.run_step("deletions index", self.deletions.create_index, "due")
+        self.run_step(
+            "warns index", self.warns.create_index,
+            [("user_id", ASCENDING), ("chat_id", ASCENDING)], unique=True
+        )
+        self.run_step("warns ttl", self.ensure_ttl_index, self.warns, "updated", WARN_EXPIRE)
+        self.run_step("search_keys ttl", self.ensure_ttl_index, self.search_keys, "created", SEARCH_KEY_EXPIRE)
+        self.run_step("broadcasts index", self.broadcasts.create_index, "state")
+        # before the unique (chat_id, name) indexes below
+        self.run_step("group items migration", self.run_migration, "group_items_v1", self.migrate_group_items)
+        for kind, col in self.items.items():
+            self.run_step(
+                f"{kind} index", col.create_index,
+                [("chat_id", ASCENDING), ("name", ASCENDING)], unique=True
+            )
+        # startup ban list
+        self.run_step(
+            "banned index", self.users.create_index,
+            "ban_status.is_banned", name="banned",
+            partialFilterExpression={"ban_status.is_banned": True}
+        )
+        self.run_step(
+            "disabled index", self.groups.create_index,
+            "chat_status.is_disabled", name="disabled",
+            partialFilterExpression={"chat_status.is_disabled": True}
+        )
+        self.run_step("premium migration", self.migrate_premium)
+        self.run_step("premium unique index", self.ensure_premium_index)
+        # upcoming expiries of active plans
+        self.run_step(
+            "active_expire index", self.premium.create_index,
+            [("status.premium", ASCENDING), ("status.expire", ASCENDING)],
+            name="active_expire",
+            partialFilterExpression={"status.premium": True}
+        )
+
+    @staticmethod
+    def run_step(step, func, *args, **kwargs):
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Index creation failed ({step}): {e}")
+
+    @staticmethod
+    def ensure_ttl_index(col, field, seconds):
+        """
+        TTL index on `field`. create_index raises IndexOptionsConflict when
+        the expiry changes, so an existing index is updated with collMod.
+        """
+        index = col.index_information().get(f"{field}_1")
+        if not index:
+            col.create_index(field, expireAfterSeconds=seconds)
+        elif index.get("expireAfterSeconds") != seconds:
+            try:
+                col.database.command(
+                    "collMod", col.name,
+                    index={"keyPattern": {field: 1}, "expireAfterSeconds": seconds}
+                )
+            except OperationFailure:
+                # plain index on the field (not TTL yet): rebuild it
+                col.drop_index(f"{field}_1")
+                col.create_index(field, expireAfterSeconds=seconds)
+
+    def ensure_premium_index(self):
+        try:
+            self.premium.create_index("id", unique=True, name="premium_id")
+        except OperationFailure:
+            # old find_one + insert_one could create duplicates
+            self.dedupe_premium()
+            self.premium.create_index("id", unique=True, name="premium_id")
+
+    def migrate_premium(self):
+        """Empty / inactive string expiries become None (active ones are parsed by the expiry scheduler)"""
+        self.premium.update_many(
+            {"status.expire": ""},
+            {"$set": {"status.expire": None}}
+        )
+        self.premium.update_many(
+            {"status.premium": {"$ne": True}, "status.expire": {"$type": "string"}},
+            {"$set": {"status.expire": None}}
+        )
+
+    def run_migration(self, name, func):
+        """One-shot migration, marked done in Migrations only after it completes"""
+        if self.migrations.find_one({"_id": name}, {"_id": 1}):
+            return
+        func()
+        self.migrations.insert_one({"_id": name, "done": datetime.utcnow()})
+
+    def migrate_group_items(self):
+        """Move filters / notes / blacklist / dlink out of Groups.settings"""
+        query = {"$or": [{f"settings.{kind}": {"$exists": True}} for kind in self.items]}
+        for grp in self.groups.find(query, {"id": 1, "settings": 1}):
+            chat_id = grp["id"]
+            settings = grp.get("settings", {})
+            for kind, col in self.items.items():
+                old = settings.get(kind)
+                if not old:
+                    continue
+                if kind == "blacklist":
+                    old = {word: {} for word in old}
+                elif kind == "dlink":
+                    old = {word: {"delay": delay} for word, delay in old.items()}
+                col.bulk_write([
+                    UpdateOne(
+                        {"chat_id": chat_id, "name": name},
+                        {"$set": {"name": name, **data}},
+                        upsert=True
+                    )
+                    for name, data in old.items()
+                ])
+            self.groups.update_one(
+                {"_id": grp["_id"]},
+                {"$unset": {f"settings.{kind}": "" for kind in self.items}}
+            )
+
+    def dedupe_premium(self):
+        """Keep only the newest plan document per user"""
+        dupes = self.premium.aggregate([
+            {"$sort": {"_id": -1}},
+            {"$group": {"_id": "$id", "docs": {"$push": "$_id"}, "n": {"$sum": 1}}},
+            {"$match": {"n": {"$gt": 1}}}
+        ])
+        for d in dupes:
+            self.premium.delete_many({"_id": {"$in": d["docs"][1:]}})
 
     # ───────── USERS ─────────
     def new_user(self, user_id, name):
@@ -71,6 +226,7 @@ class Database:
 
     async def add_user(self, user_id, name):
         self.users.insert_one(self.new_user(user_id, name))
+        self.bump_counters({"users": 1})
 
     async def is_user_exist(self, user_id):
         return bool(self.users.find_one({"id": int(user_id)}))
@@ -83,7 +239,9 @@ class Database:
         return self.users.find({})
 
     async def delete_user(self, user_id):
-        self.users.delete_many({"id": int(user_id)})
+        deleted = self.users.delete_many({"id": int(user_id)}).deleted_count
+        if deleted:
+            self.bump_counters({"users": -deleted})
 
     async def ban_user(self, user_id, reason="No Reason"):
         self.users.update_one(
@@ -97,6 +255,9 @@ class Database:
             {"$set": {"ban_status": {"is_banned": False, "ban_reason": ""}}}
         )
 
+    async def remove_ban(self, user_id):
+        await self.unban_user(user_id)
+
     async def get_ban_status(self, user_id):
         user = self.users.find_one({"id": int(user_id)})
         return user.get("ban_status") if user else {
@@ -113,14 +274,17 @@ class Database:
                 "is_disabled": False,
                 "reason": ""
             },
-            "settings": self.default_setgs
+            "settings": dict(self.default_setgs)
         }
 
     async def add_chat(self, group_id, title):
         self.groups.insert_one(self.new_group(group_id, title))
+        self.bump_counters({"chats": 1})
 
     async def delete_chat(self, group_id):
-        self.groups.delete_many({"id": int(group_id)})
+        deleted = self.groups.delete_many({"id": int(group_id)}).deleted_count
+        if deleted:
+            self.bump_counters({"chats": -deleted})
 
     async def get_chat(self, group_id):
         grp = self.groups.find_one({"id": int(group_id)})
@@ -144,6 +308,16 @@ class Database:
     async def get_all_chats(self):
         return self.groups.find({})
 
+    def export_cursor(self, kind):
+        """Projected, batched cursor for the /users and /chats exports"""
+        if kind == "users":
+            return self.users.find(
+                {}, {"_id": 0, "id": 1, "name": 1, "ban_status.is_banned": 1}
+            ).batch_size(5000)
+        return self.groups.find(
+            {}, {"_id": 0, "id": 1, "title": 1, "chat_status.is_disabled": 1}
+        ).batch_size(5000)
+
     # ───────── GROUP SETTINGS ─────────
     async def update_settings(self, group_id, settings):
         self.groups.update_one(
@@ -151,61 +325,170 @@ class Database:
             {"$set": {"settings": settings}}
         )
 
+    async def update_setting(self, group_id, key, value):
+        """Single key, so concurrent writers don't overwrite each other"""
+        self.groups.update_one(
+            {"id": int(group_id)},
+            {"$set": {f"settings.{key}": value}}
+        )
+
     async def get_settings(self, group_id):
-        grp = self.groups.find_one({"id": int(group_id)})
-        if grp:
-            settings = grp.get("settings", self.default_setgs)
-            # ✅ Ensure search_enabled exists in old groups
-            if "search_enabled" not in settings:
-                settings["search_enabled"] = True
-            return settings
-        return self.default_setgs
+        """Stored settings over a fresh copy of the defaults (old groups get new keys)"""
+        grp = self.groups.find_one({"id": int(group_id)}, {"settings": 1})
+        stored = grp.get("settings") if grp else None
+        return {**self.default_setgs, **(stored or {})}
+
+    def watch_groups(self, max_await_ms=None):
+        """Change stream of group updates (replica set / Atlas only)"""
+        return self.groups.watch(
+            [{"$match": {"operationType": {"$in": ["update", "replace", "delete"]}}}],
+            full_document="updateLookup",
+            max_await_time_ms=max_await_ms
+        )
+
+    # ───────── WARNS ─────────
+    async def add_warn(self, user_id, chat_id):
+        """+1 warn in one round-trip, returns the new count"""
+        doc = self.warns.find_one_and_update(
+            {"user_id": int(user_id), "chat_id": int(chat_id)},
+            {"$inc": {"count": 1}, "$set": {"updated": datetime.utcnow()}},
+            projection={"_id": 0, "count": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["count"]
+
+    async def clear_warn(self, user_id, chat_id):
+        self.warns.delete_one({"user_id": int(user_id), "chat_id": int(chat_id)})
+
+    # ───────── GROUP ITEMS (filters / notes / blacklist / dlink) ─────────
+    async def get_items(self, kind, chat_id, fields=None):
+        """{name: data} of one kind for a chat, only `fields` if given"""
+        if fields is None:
+            projection = {"_id": 0, "chat_id": 0}
+        else:
+            projection = {"_id": 0, "name": 1, **{f: 1 for f in fields}}
+        items = {}
+        for doc in self.items[kind].find({"chat_id": int(chat_id)}, projection):
+            items[doc.pop("name")] = doc
+        return items
+
+    async def get_item(self, kind, chat_id, name):
+        return self.items[kind].find_one(
+            {"chat_id": int(chat_id), "name": name},
+            {"_id": 0, "chat_id": 0}
+        )
+
+    async def save_item(self, kind, chat_id, name, data=None):
+        self.items[kind].update_one(
+            {"chat_id": int(chat_id), "name": name},
+            {"$set": {"name": name, **(data or {})}},
+            upsert=True
+        )
+
+    async def delete_item(self, kind, chat_id, name):
+        return self.items[kind].delete_one({"chat_id": int(chat_id), "name": name}).deleted_count
+
+    async def delete_items(self, kind, chat_id):
+        return self.items[kind].delete_many({"chat_id": int(chat_id)}).deleted_count
+
+    async def count_items(self, kind, chat_id):
+        return self.items[kind].count_documents({"chat_id": int(chat_id)})
 
     # ───────── PREMIUM (Enhanced for Premium.py) ─────────
     def get_plan(self, user_id):
         """Get user's premium plan with all reminder flags"""
-        st = self.premium.find_one({"id": int(user_id)})
+        st = self.premium.find_one({"id": int(user_id)}, {"status": 1})
         if st:
             # ✅ Ensure all reminder flags exist
-            status = st["status"]
-            if "reminded_24h" not in status:
-                status["reminded_24h"] = False
-            if "reminded_6h" not in status:
-                status["reminded_6h"] = False
-            if "reminded_1h" not in status:
-                status["reminded_1h"] = False
-            return status
+            return {**self.default_prm, **st["status"]}
         return self.default_prm.copy()
 
+    def get_plans(self, user_ids):
+        """Batch version of get_plan: {user_id: status} for users with a plan"""
+        ids = [int(i) for i in user_ids]
+        return {
+            p["id"]: {**self.default_prm, **p["status"]}
+            for p in self.premium.find({"id": {"$in": ids}}, {"id": 1, "status": 1})
+        }
+
     def update_plan(self, user_id, data):
         """Update user's premium plan"""
-        if not self.premium.find_one({"id": int(user_id)}):
-            self.premium.insert_one({"id": int(user_id), "status": data})
-        else:
-            self.premium.update_one(
-                {"id": int(user_id)},
-                {"$set": {"status": data}}
-            )
+        old = self.premium.find_one_and_update(
+            {"id": int(user_id)},
+            {"$set": {"status": data}},
+            projection={"status.premium": 1},
+            upsert=True
+        )
+        was_premium = bool(old and old.get("status", {}).get("premium"))
+        if was_premium != bool(data.get("premium")):
+            self.bump_counters({"premium": -1 if was_premium else 1})
+        self.plan_changed(user_id)
+
+    def set_reminder_flag(self, user_id, flag, value=True):
+        self.premium.update_one(
+            {"id": int(user_id)},
+            {"$set": {f"status.{flag}": value}}
+        )
+        self.plan_changed(user_id)
+
+    def plan_changed(self, user_id):
+        for listener in self.plan_listeners:
+            try:
+                listener(int(user_id))
+            except Exception as e:
+                logger.error(f"Plan listener failed: {e}")
 
     def get_premium_count(self):
         """Get total count of active premium users"""
         return self.premium.count_documents({"status.premium": True})
 
-    def get_premium_users(self):
-        """Get all premium users (active + expired)"""
-        return self.premium.find({})
+    def get_premium_page(self, skip, limit):
+        """One page of active plans, soonest expiry first"""
+        return list(
+            self.premium.find(
+                {"status.premium": True},
+                {"_id": 0, "id": 1, "status.plan": 1, "status.expire": 1}
+            ).sort([("status.premium", ASCENDING), ("status.expire", ASCENDING)])
+            .skip(skip).limit(limit)
+        )
     
+    def get_expiring_plans(self, until):
+        """Active plans expiring before `until` (already expired included)"""
+        return self.premium.find(
+            {"status.premium": True, "status.expire": {"$lte": until}},
+            {"id": 1, "status": 1}
+        )
+
+    def get_string_expiry_plans(self):
+        """Active plans whose expire is still a legacy string"""
+        return self.premium.find(
+            {"status.premium": True, "status.expire": {"$type": "string", "$ne": ""}},
+            {"id": 1, "status.expire": 1}
+        )
+
+    def set_plan_expire(self, user_id, expire):
+        self.premium.update_one(
+            {"id": int(user_id)},
+            {"$set": {"status.expire": expire}}
+        )
+        self.plan_changed(user_id)
+
     def get_active_premium_users(self):
         """Get only active premium users"""
         return self.premium.find({"status.premium": True})
     
     def reset_reminder_flags(self, user_id):
         """Reset all reminder flags for a user (useful when extending plan)"""
-        mp = self.get_plan(user_id)
-        mp["reminded_24h"] = False
-        mp["reminded_6h"] = False
-        mp["reminded_1h"] = False
-        self.update_plan(user_id, mp)
+        self.premium.update_one(
+            {"id": int(user_id)},
+            {"$set": {
+                "status.reminded_24h": False,
+                "status.reminded_6h": False,
+                "status.reminded_1h": False
+            }}
+        )
+        self.plan_changed(user_id)
 
     # ───────── CONNECTIONS ─────────
     def add_connect(self, group_id, user_id):
@@ -236,6 +519,155 @@ class Database:
         """Remove all connections for a user"""
         self.connections.delete_one({"_id": int(user_id)})
 
+    async def set_active_connection(self, user_id, group_id):
+        """Chat managed from DM by admin commands"""
+        self.connections.update_one(
+            {"_id": int(user_id)},
+            {"$set": {"active": int(group_id)}, "$addToSet": {"group_ids": int(group_id)}},
+            upsert=True
+        )
+
+    async def get_active_connection(self, user_id):
+        user = self.connections.find_one({"_id": int(user_id)}, {"active": 1})
+        return user.get("active") if user else None
+
+    async def clear_active_connection(self, user_id):
+        self.connections.update_one(
+            {"_id": int(user_id)},
+            {"$unset": {"active": ""}}
+        )
+
+    # ───────── FAILED NOTIFICATIONS ─────────
+    def save_notification(self, doc):
+        self.notifications.insert_one(doc)
+
+    def pop_due_notifications(self, now, limit=500):
+        """Remove and return failed notifications due for another try"""
+        docs = list(self.notifications.find({"next_try": {"$lte": now}}).limit(limit))
+        if docs:
+            self.notifications.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+        return docs
+
+    # ───────── SCHEDULED DELETIONS ─────────
+    def add_deletion(self, chat_id, message_ids, due):
+        return self.deletions.insert_one({
+            "chat_id": int(chat_id),
+            "message_ids": message_ids,
+            "due": due
+        }).inserted_id
+
+    def get_deletions(self, start, end):
+        """Deletions due in [start, end)"""
+        return list(self.deletions.find({"due": {"$gte": start, "$lt": end}}))
+
+    def remove_deletions(self, ids):
+        self.deletions.delete_many({"_id": {"$in": ids}})
+
+    # ───────── SEARCH PAGINATION KEYS ─────────
+    async def save_search_key(self, key, search):
+        self.search_keys.update_one(
+            {"_id": key},
+            {"$set": {"search": search, "created": datetime.utcnow()}},
+            upsert=True
+        )
+
+    async def get_search_key(self, key):
+        doc = self.search_keys.find_one({"_id": key}, {"search": 1})
+        return doc["search"] if doc else None
+
+    # ───────── BROADCASTS ─────────
+    def broadcast_targets(self, kind, after=None):
+        """Recipient ids in _id order, resumable from a checkpoint"""
+        col = self.users if kind == "users" else self.groups
+        query = {"_id": {"$gt": after}} if after else {}
+        return col.find(query, {"id": 1}).sort("_id", ASCENDING).batch_size(1000)
+
+    def prune_targets(self, kind, ids):
+        """Bulk delete users / chats that can never be reached again"""
+        col = self.users if kind == "users" else self.groups
+        deleted = col.delete_many({"id": {"$in": ids}}).deleted_count
+        if deleted:
+            self.bump_counters({"users" if kind == "users" else "chats": -deleted})
+
+    def create_broadcast(self, doc):
+        return self.broadcasts.insert_one(doc).inserted_id
+
+    def update_broadcast(self, broadcast_id, fields, inc=None):
+        update = {"$set": fields}
+        if inc:
+            update["$inc"] = inc
+        return self.broadcasts.find_one_and_update(
+            {"_id": broadcast_id}, update,
+            projection={"cancelled": 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def claim_broadcast(self, broadcast_id, stale_before):
+        """Take over a running broadcast whose owner stopped checkpointing"""
+        return self.broadcasts.find_one_and_update(
+            {"_id": broadcast_id, "state": "running", "heartbeat": {"$lt": stale_before}},
+            {"$set": {"heartbeat": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    def get_running_broadcasts(self):
+        return list(self.broadcasts.find({"state": "running"}, {"_id": 1}))
+
+    def cancel_broadcast(self, broadcast_id):
+        self.broadcasts.update_one({"_id": broadcast_id}, {"$set": {"cancelled": True}})
+
+    # ───────── STATS COUNTERS ─────────
+    # One document kept current with $inc by every write that changes a
+    # count, so /stats is a single _id read. reconcile_counters (utils)
+    # recounts in the background and overwrites it to repair drift.
+    def bump_counters(self, incs):
+        try:
+            self.counters.update_one({"_id": "stats"}, {"$inc": incs}, upsert=True)
+        except Exception as e:
+            logger.error(f"Counter update failed: {e}")
+
+    def set_counters(self, values):
+        self.counters.update_one({"_id": "stats"}, {"$set": values}, upsert=True)
+
+    def get_counters(self):
+        return self.counters.find_one({"_id": "stats"}) or {}
+
+    def recount(self):
+        """Exact counts for reconcile (slow, run in a thread)"""
+        return {
+            "users": self.users.count_documents({}),
+            "chats": self.groups.count_documents({}),
+            "premium": self.premium.count_documents({"status.premium": True})
+        }
+
+    # ───────── BIN CHANNEL COPIES ─────────
+    def get_bin_copy(self, file_id):
+        """BIN_CHANNEL message id of an already copied file"""
+        doc = self.bin_copies.find_one({"_id": file_id}, {"msg_id": 1})
+        return doc.get("msg_id") if doc else None
+
+    def save_bin_copy(self, file_id, msg_id):
+        self.bin_copies.update_one(
+            {"_id": file_id},
+            {"$set": {"msg_id": msg_id}},
+            upsert=True
+        )
+
+    def add_file_request(self, file_id):
+        self.bin_copies.update_one(
+            {"_id": file_id},
+            {"$inc": {"requests": 1}},
+            upsert=True
+        )
+
+    def get_top_uncopied(self, limit):
+        """Most requested files that have no BIN_CHANNEL copy yet"""
+        return (
+            self.bin_copies.find({"msg_id": {"$exists": False}}, {"_id": 1})
+            .sort("requests", DESCENDING)
+            .limit(limit)
+        )
+
     # ───────── BOT SETTINGS ─────────
     def update_bot_sttgs(self, var, val):
         if not self.settings.find_one({"id": BOT_ID}):
@@ -263,14 +695,14 @@ class Database:
         Used at bot startup
         Returns list of banned users and disabled chats
         """
-        banned_users = []
-        banned_chats = []
-
-        for u in self.users.find({"ban_status.is_banned": True}):
-            banned_users.append(u["id"])
-
-        for g in self.groups.find({"chat_status.is_disabled": True}):
-            banned_chats.append(g["id"])
+        banned_users = [
+            u["id"] for u in
+            self.users.find({"ban_status.is_banned": True}, {"_id": 0, "id": 1})
+        ]
+        banned_chats = [
+            g["id"] for g in
+            self.groups.find({"chat_status.is_disabled": True}, {"_id": 0, "id": 1})
+        ]
 
         return banned_users, banned_chats
 
@@ -113,6 +113,26 @@ INDEX_EXTENSIONS = environ.get(
 ).lower().split()
 
 PM_FILE_DELETE_TIME = int(environ.get("PM_FILE_DELETE_TIME", 3600))
+SEARCH_KEY_EXPIRE = int(environ.get("SEARCH_KEY_EXPIRE", 7 * 86400))  # Next/Prev buttons work this long
+WARN_EXPIRE = int(environ.get("WARN_EXPIRE", 7 * 86400))  # warns reset after this long without a new one
+
+# Search rate limits: searches per minute (burst) for each key
+SEARCH_LIMIT_PM = int(environ.get("SEARCH_LIMIT_PM", 20))  # per premium user in PM
+SEARCH_BURST_PM = int(environ.get("SEARCH_BURST_PM", 5))
+SEARCH_LIMIT_USER = int(environ.get("SEARCH_LIMIT_USER", 10))  # per user in groups
+SEARCH_BURST_USER = int(environ.get("SEARCH_BURST_USER", 3))
+SEARCH_LIMIT_CHAT = int(environ.get("SEARCH_LIMIT_CHAT", 60))  # per group
+SEARCH_BURST_CHAT = int(environ.get("SEARCH_BURST_CHAT", 10))
+
+# Search analytics rollups are kept this long
+ANALYTICS_EXPIRE = int(environ.get("ANALYTICS_EXPIRE", 30 * 86400))
+
+# Broadcasts: concurrent sends, all drawing from the NOTIFY_RATE bucket
+BROADCAST_WORKERS = int(environ.get("BROADCAST_WORKERS", 20))
+
+# Outbound notifications (reminders, expiry notices, startup messages)
+NOTIFY_WORKERS = int(environ.get("NOTIFY_WORKERS", 8))
+NOTIFY_RATE = int(environ.get("NOTIFY_RATE", 25))  # messages / second, Telegram allows ~30
 
 
 # ─────────────────────────────────────────────
@@ -125,6 +145,8 @@ PROTECT_CONTENT = is_enabled("PROTECT_CONTENT", False)
 SPELL_CHECK = is_enabled("SPELL_CHECK", True)
 IS_STREAM = is_enabled("IS_STREAM", True)
 IS_PREMIUM = is_enabled("IS_PREMIUM", True)
+THROTTLE_NOTICE = is_enabled("THROTTLE_NOTICE", True)  # False drops throttled searches quietly
+SETTINGS_WATCH = is_enabled("SETTINGS_WATCH", False)  # change stream invalidation, needs a replica set
 
 
 # ─────────────────────────────────────────────
@@ -156,6 +178,20 @@ else:
     logger.error("Invalid URL")
     exit(1)
 
+# Extra bot tokens used only for streaming (each bot must be admin in BIN_CHANNEL)
+MULTI_TOKENS = environ.get("MULTI_TOKENS", "").split()
+
+# Stream concurrency limits
+STREAM_LIMIT = int(environ.get("STREAM_LIMIT", 100))
+STREAM_LIMIT_PER_IP = int(environ.get("STREAM_LIMIT_PER_IP", 4))
+GETFILE_LIMIT = int(environ.get("GETFILE_LIMIT", 16))  # per client
+TRUSTED_PROXY_HOPS = int(environ.get("TRUSTED_PROXY_HOPS", 1))  # proxies in front of us that append to X-Forwarded-For, 0 = ignore it
+STREAM_RETRY_AFTER = int(environ.get("STREAM_RETRY_AFTER", 10))
+STREAM_PREFETCH = int(environ.get("STREAM_PREFETCH", 2))  # GetFile requests ahead per stream
+
+# Rendered /watch pages kept in memory
+WATCH_CACHE_SIZE = int(environ.get("WATCH_CACHE_SIZE", 512))
+
 
 # ─────────────────────────────────────────────
 # 🎭 REACTIONS / STICKERS
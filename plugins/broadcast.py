@@ -0,0 +1,230 @@
+import time
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+from hydrogram import Client, filters, enums
+from hydrogram.errors import (
+    FloodWait, UserIsBlocked, InputUserDeactivated, UserDeactivated,
+    ChannelPrivate, ChannelInvalid, ChatIdInvalid
+)
+from hydrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message, CallbackQuery
+from database.users_chats_db import db
+from info import ADMINS, BROADCAST_WORKERS
+from utils import notifier, get_readable_time
+
+# chats that will never accept a message again, pruned in bulk.
+# Blocked users are only counted: they can unblock the bot later.
+DEAD_ERRORS = {
+    "users": (InputUserDeactivated, UserDeactivated),
+    "groups": (ChannelPrivate, ChannelInvalid, ChatIdInvalid)
+}
+
+# running in this process: {broadcast_id: Broadcast}
+RUNNING = {}
+
+
+# ─────────────────────────────────────────────
+# 📢 BROADCAST ENGINE
+# ─────────────────────────────────────────────
+class Broadcast:
+    """
+    One broadcast run, stored in the Broadcasts collection.
+
+    Recipients are streamed from a projected cursor in _id order and sent
+    in chunks of CHUNK by BROADCAST_WORKERS concurrent senders that share
+    the notifier's token bucket. After each chunk the last _id and the
+    counters are checkpointed, so after a restart the broadcast resumes
+    from there (at most one chunk is sent twice).
+    """
+    CHUNK = 200
+    PROGRESS_EVERY = 10
+    LEASE = timedelta(minutes=3)
+
+    def __init__(self, bot, doc):
+        self.bot = bot
+        self.doc = doc
+        self.id = doc["_id"]
+        self.cancelled = False
+        self.started = time.time()
+        self.sent_now = 0  # this process only, for throughput
+        self.last_progress = 0
+
+    async def send(self, chat_id):
+        doc = self.doc
+        for _ in range(3):
+            await notifier.bucket.acquire()
+            try:
+                msg = await self.bot.copy_message(chat_id, doc["from_chat"], doc["msg_id"])
+                if doc["pin"]:
+                    try:
+                        await msg.pin(both_sides=doc["kind"] == "users")
+                    except Exception:
+                        pass
+                return "success"
+            except FloodWait as e:
+                notifier.bucket.pause(e.value)
+            except DEAD_ERRORS[doc["kind"]]:
+                return "pruned"
+            except UserIsBlocked:
+                return "blocked"
+            except Exception:
+                return "failed"
+        return "failed"
+
+    async def run(self):
+        RUNNING[self.id] = self
+        limit = asyncio.Semaphore(BROADCAST_WORKERS)
+
+        async def send_one(chat_id):
+            async with limit:
+                return chat_id, await self.send(chat_id)
+
+        cursor = db.broadcast_targets(self.doc["kind"], self.doc.get("last_id"))
+        try:
+            chunk = []
+            for target in cursor:
+                chunk.append(target)
+                if len(chunk) >= self.CHUNK:
+                    await self.flush(chunk, send_one)
+                    chunk = []
+                    if self.cancelled:
+                        break
+            if chunk and not self.cancelled:
+                await self.flush(chunk, send_one)
+
+            state = "cancelled" if self.cancelled else "done"
+            db.update_broadcast(self.id, {"state": state, "finished": datetime.utcnow()})
+            await self.progress(state)
+        except Exception as e:
+            print(f"Broadcast {self.id} stopped: {e}")
+        finally:
+            cursor.close()
+            RUNNING.pop(self.id, None)
+
+    async def flush(self, chunk, send_one):
+        results = await asyncio.gather(*[send_one(t["id"]) for t in chunk])
+
+        counts = {"done": len(chunk), "success": 0, "blocked": 0, "pruned": 0, "failed": 0}
+        dead = []
+        for chat_id, result in results:
+            counts[result] += 1
+            if result == "pruned":
+                dead.append(chat_id)
+        if dead:
+            db.prune_targets(self.doc["kind"], dead)
+
+        for key, value in counts.items():
+            self.doc[key] = self.doc.get(key, 0) + value
+        self.sent_now += len(chunk)
+
+        # checkpoint, also picks up a cancel from another process
+        state = db.update_broadcast(
+            self.id,
+            {"last_id": chunk[-1]["_id"], "heartbeat": datetime.utcnow()},
+            inc=counts
+        )
+        if state and state.get("cancelled"):
+            self.cancelled = True
+
+        if time.time() - self.last_progress >= self.PROGRESS_EVERY:
+            await self.progress("running")
+
+    async def progress(self, state):
+        self.last_progress = time.time()
+        d = self.doc
+        elapsed = time.time() - self.started
+        rate = self.sent_now / elapsed if elapsed else 0
+        left = max(d["total"] - d.get("done", 0), 0)
+
+        title = {
+            "running": "📢 <b>Broadcasting...</b>",
+            "done": "✅ <b>Broadcast Completed</b>",
+            "cancelled": "🛑 <b>Broadcast Cancelled</b>"
+        }[state]
+        text = (
+            f"{title}\n\n"
+            f"🎯 Target: {d['kind'].title()}{' (pinned)' if d['pin'] else ''}\n"
+            f"📊 Progress: <code>{d.get('done', 0)}/{d['total']}</code>\n\n"
+            f"✅ Success: <code>{d.get('success', 0)}</code>\n"
+            f"🚫 Blocked: <code>{d.get('blocked', 0)}</code>\n"
+            f"🗑 Pruned: <code>{d.get('pruned', 0)}</code>\n"
+            f"❌ Failed: <code>{d.get('failed', 0)}</code>\n\n"
+            f"⚡ Speed: <code>{rate:.1f}/s</code>\n"
+            f"⏱ Elapsed: <code>{get_readable_time(elapsed)}</code>"
+        )
+        markup = None
+        if state == "running":
+            if rate:
+                text += f"\n⏳ ETA: <code>{get_readable_time(left / rate)}</code>"
+            markup = InlineKeyboardMarkup([[
+                InlineKeyboardButton("🛑 Cancel", callback_data=f"bcast_cancel#{self.id}")
+            ]])
+        try:
+            await self.bot.edit_message_text(
+                d["status_chat"], d["status_msg"], text,
+                reply_markup=markup, parse_mode=enums.ParseMode.HTML
+            )
+        except Exception:
+            pass
+
+
+async def resume_broadcasts(bot):
+    """
+    Pick up running broadcasts whose owner stopped checkpointing
+    (this process after a restart, or a dead replica).
+    """
+    while True:
+        try:
+            stale = datetime.utcnow() - Broadcast.LEASE
+            for b in db.get_running_broadcasts():
+                if b["_id"] in RUNNING:
+                    continue
+                doc = db.claim_broadcast(b["_id"], stale)
+                if doc:
+                    asyncio.create_task(Broadcast(bot, doc).run())
+        except Exception as e:
+            print(f"Broadcast resume failed: {e}")
+        await asyncio.sleep(60)
+
+
+# ─────────────────────────────────────────────
+# 🧾 COMMANDS
+# ─────────────────────────────────────────────
+@Client.on_message(
+    filters.command(["broadcast", "pin_broadcast", "grp_broadcast", "pin_grp_broadcast"])
+    & filters.user(ADMINS)
+)
+async def broadcast_cmd(bot: Client, message: Message):
+    """Reply to a message with /broadcast, /pin_broadcast, /grp_broadcast or /pin_grp_broadcast"""
+    if not message.reply_to_message:
+        return await message.reply("❌ Reply to the message you want to broadcast.")
+
+    cmd = message.command[0].lower()
+    kind = "groups" if "grp" in cmd else "users"
+    total = await (db.total_chat_count() if kind == "groups" else db.total_users_count())
+
+    status = await message.reply("📢 Starting broadcast...")
+    doc = {
+        "kind": kind,
+        "pin": cmd.startswith("pin_"),
+        "from_chat": message.chat.id,
+        "msg_id": message.reply_to_message.id,
+        "status_chat": status.chat.id,
+        "status_msg": status.id,
+        "total": total,
+        "state": "running",
+        "started": datetime.utcnow(),
+        "heartbeat": datetime.utcnow()
+    }
+    doc["_id"] = db.create_broadcast(doc)
+    asyncio.create_task(Broadcast(bot, doc).run())
+
+
+@Client.on_callback_query(filters.regex(r'^bcast_cancel#') & filters.user(ADMINS))
+async def broadcast_cancel(bot: Client, query: CallbackQuery):
+    broadcast_id = ObjectId(query.data.split('#')[1])
+    db.cancel_broadcast(broadcast_id)
+    running = RUNNING.get(broadcast_id)
+    if running:
+        running.cancelled = True
+    await query.answer("Cancelling after the current batch...")
@@ -6,10 +6,10 @@ from datetime import datetime
 
 from Script import script
 from hydrogram import Client, filters, enums
+from hydrogram.errors import FloodWait
 from hydrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 from database.ia_filterdb import (
-    db_count_documents,
     get_file_details,
     delete_files
 )
@@ -18,7 +18,6 @@ from database.users_chats_db import db
 from info import (
     IS_PREMIUM,
     URL,
-    BIN_CHANNEL,
     STICKERS,
     ADMINS,
     DELETE_TIME,
@@ -37,26 +36,19 @@ from utils import (
     temp,
     get_readable_time,
     get_wish,
-    get_premium_button
+    get_premium_button,
+    get_bin_msg_id,
+    schedule_delete,
+    premium_cache_ratio,
+    PREMIUM_STATS,
+    SEARCH_LIMITS
 )
 
 # ─────────────────────────
 # HELPERS
 # ─────────────────────────
-async def del_stk(s):
-    await asyncio.sleep(3)
-    try:
-        await s.delete()
-    except:
-        pass
-
-async def auto_delete_messages(msg_ids, chat_id, client, delay):
-    """Auto delete multiple messages after delay"""
-    await asyncio.sleep(delay)
-    try:
-        await client.delete_messages(chat_id=chat_id, message_ids=msg_ids)
-    except Exception as e:
-        print(f"Auto delete error: {e}")
+def del_stk(s):
+    schedule_delete(s.chat.id, s.id, 3)
 
 # ─────────────────────────
 # /start
@@ -100,7 +92,7 @@ async def start(client, message):
                 message.chat.id,
                 random.choice(STICKERS)
             )
-            asyncio.create_task(del_stk(stk))
+            del_stk(stk)
         except:
             pass
 
@@ -164,8 +156,7 @@ async def start(client, message):
                         message.chat.id,
                         '❌ No Such File Exist!'
                     )
-                    await asyncio.sleep(5)
-                    await temp_msg.delete()
+                    schedule_delete(temp_msg.chat.id, temp_msg.id, 5)
                     return
                 
                 files = files_
@@ -196,6 +187,8 @@ async def start(client, message):
                     protect_content=False,
                     reply_markup=InlineKeyboardMarkup(btn)
                 )
+                # popularity for /warm_bin
+                db.add_file_request(file_id)
                 
                 if PM_FILE_DELETE_TIME and PM_FILE_DELETE_TIME > 0:
                     time = get_readable_time(PM_FILE_DELETE_TIME)
@@ -212,9 +205,7 @@ async def start(client, message):
                         'chat_id': message.chat.id
                     }
                     
-                    asyncio.create_task(
-                        auto_delete_messages([vp.id, msg.id], message.chat.id, client, PM_FILE_DELETE_TIME)
-                    )
+                    schedule_delete(message.chat.id, [vp.id, msg.id], PM_FILE_DELETE_TIME)
                 return
         except Exception as e:
             print(f"Error parsing start command: {e}")
@@ -252,15 +243,18 @@ async def start(client, message):
 @Client.on_message(filters.command("stats") & filters.user(ADMINS))
 async def stats(_, message):
 
-    files = db_count_documents()
+    # one indexed read, kept current by the writers (see db.bump_counters)
+    counters = db.get_counters()
+    files = counters.get("files", {})
     primary = files.get("primary", 0)
     cloud = files.get("cloud", 0)
     archive = files.get("archive", 0)
-    total = files.get("total", 0)
+    total = primary + cloud + archive
+    size = sum(counters.get("size", {}).values())
 
-    users = await db.total_users_count()
-    chats = await db.total_chat_count()
-    premium = db.get_premium_count()
+    users = counters.get("users", 0)
+    chats = counters.get("chats", 0)
+    premium = counters.get("premium", 0)
 
     text = f"""
 📊 <b>Bot Statistics</b>
@@ -276,7 +270,18 @@ async def stats(_, message):
 🗄 Archive   : <code>{archive}</code>
 
 🧮 <b>Total Files</b> : <code>{total}</code>
+💾 <b>Total Size</b>  : <code>{get_size(size)}</code>
 ⏱ <b>Uptime</b> : <code>{get_readable_time(time_now() - temp.START_TIME)}</code>
+
+⚡ <b>Cache</b>
+
+💎 Premium hits : <code>{premium_cache_ratio():.1f}%</code> ({PREMIUM_STATS['hits']}/{PREMIUM_STATS['hits'] + PREMIUM_STATS['misses']})
+
+🚦 <b>Throttled Searches</b>
+
+👤 PM     : <code>{SEARCH_LIMITS['pm'].throttled}</code>
+👥 Users  : <code>{SEARCH_LIMITS['user'].throttled}</code>
+💬 Groups : <code>{SEARCH_LIMITS['chat'].throttled}</code>
 """
 
     await message.reply_text(text, parse_mode=enums.ParseMode.HTML)
@@ -540,13 +545,10 @@ async def stream_cb(client, query):
         
         file = files[0] if isinstance(files, list) else files
         
-        msg = await client.send_cached_media(
-            chat_id=BIN_CHANNEL,
-            file_id=file_id
-        )
+        msg_id = await get_bin_msg_id(client, file_id)
 
-        watch = f"{URL}watch/{msg.id}"
-        download = f"{URL}download/{msg.id}"
+        watch = f"{URL}watch/{msg_id}"
+        download = f"{URL}download/{msg_id}"
 
         buttons = [
             [
@@ -573,6 +575,47 @@ async def stream_cb(client, query):
         print(f"Stream error: {e}")
         await query.answer("❌ Error!", show_alert=True)
 
+# ─────────────────────────
+# /warm_bin - PRE-COPY POPULAR FILES
+# ─────────────────────────
+@Client.on_message(filters.command("warm_bin") & filters.user(ADMINS))
+async def warm_bin(client, message):
+    """
+    Usage: /warm_bin [count]
+
+    Copies the most requested files to BIN_CHANNEL ahead of time
+    so their stream links are ready on the first click.
+    """
+    limit = 50
+    if len(message.command) > 1:
+        if not message.command[1].isdigit():
+            return await message.reply_text("❌ Usage: <code>/warm_bin 100</code>", parse_mode=enums.ParseMode.HTML)
+        limit = int(message.command[1])
+
+    sts = await message.reply_text("🔥 Warming BIN_CHANNEL copies...")
+    copied = failed = 0
+
+    for doc in db.get_top_uncopied(limit):
+        try:
+            await get_bin_msg_id(client, doc["_id"])
+            copied += 1
+        except FloodWait as e:
+            await asyncio.sleep(e.value)
+            try:
+                await get_bin_msg_id(client, doc["_id"])
+                copied += 1
+            except Exception:
+                failed += 1
+        except Exception:
+            failed += 1
+
+    await sts.edit_text(
+        f"✅ <b>BIN Warm Up Done!</b>\n\n"
+        f"📤 Copied: <code>{copied}</code>\n"
+        f"❌ Failed: <code>{failed}</code>",
+        parse_mode=enums.ParseMode.HTML
+    )
+
 # ─────────────────────────
 # CLOSE BUTTON
 # ─────────────────────────
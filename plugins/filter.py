@@ -1,6 +1,8 @@
 import asyncio
 import re
 import math
+import time
+from collections import OrderedDict
 
 from hydrogram import Client, filters, enums
 from hydrogram.types import (
@@ -13,7 +15,8 @@ from info import (
     DELETE_TIME,
     MAX_BTN,
     IS_PREMIUM,
-    PICS
+    PICS,
+    THROTTLE_NOTICE
 )
 
 from utils import (
@@ -24,24 +27,68 @@ from utils import (
     temp,
     get_settings,
     save_group_settings,
-    get_premium_button
+    get_premium_button,
+    schedule_delete,
+    search_throttle
 )
 
 from database.users_chats_db import db
 from database.ia_filterdb import get_search_results
+from database.analytics import analytics
+from plugins.group_mgmt import (
+    get_triggers,
+    blacklist_stage,
+    admin_mention_stage,
+    filter_stage,
+    dlink_stage
+)
 
 import random
 
-BUTTONS = {}
+# Search text behind each result message's buttons ({chat_id}-{msg_id} -> search).
+# Stored in Mongo (TTL SEARCH_KEY_EXPIRE) so paging survives restarts and
+# works on every replica; BUTTONS is only a small LRU in front of it.
+BUTTONS = OrderedDict()
+BUTTONS_SIZE = 1000
+
+
+def cache_search(key, search):
+    BUTTONS[key] = search
+    BUTTONS.move_to_end(key)
+    if len(BUTTONS) > BUTTONS_SIZE:
+        BUTTONS.popitem(last=False)
+
+
+async def save_search(key, search):
+    await db.save_search_key(key, search)
+    cache_search(key, search)
+
+
+async def get_search(key):
+    search = BUTTONS.get(key)
+    if search is None:
+        search = await db.get_search_key(key)
+    if search is not None:
+        cache_search(key, search)
+    return search
+
+
+async def throttle_reply(message, blocked):
+    """Cooldown notice once per throttled stretch, or a quiet drop"""
+    limiter, key = blocked
+    if not THROTTLE_NOTICE or not limiter.first_block(key):
+        return
+    wait = math.ceil(limiter.wait_time(key))
+    reply = await message.reply(f"⏳ Too many searches, try again in {wait}s")
+    schedule_delete(message.chat.id, [reply.id], max(wait, 5))
 
 # ─────────────────────────────────────────────
 # 🔍 PRIVATE SEARCH (PREMIUM REQUIRED)
 # ─────────────────────────────────────────────
-@Client.on_message(filters.private & filters.text & filters.incoming)
+# Commands are excluded in the filter so they fall through to their own
+# handlers (connected-chat admin commands from DM)
+@Client.on_message(filters.private & filters.text & filters.incoming & ~filters.regex(r"^/"))
 async def pm_search(client, message):
-    if message.text.startswith("/"):
-        return
-
     # ❌ Ignore forwarded messages
     if message.forward_date:
         return
@@ -61,6 +108,11 @@ async def pm_search(client, message):
     if not any(c.isalnum() for c in text):
         return
 
+    # 🚦 Rate limit before any DB work
+    blocked = search_throttle(message.from_user.id)
+    if blocked:
+        return await throttle_reply(message, blocked)
+
     # ✅ Premium check (synced with Premium.py)
     if IS_PREMIUM and not await is_premium(message.from_user.id, client):
         return await message.reply_photo(
@@ -80,75 +132,184 @@ async def pm_search(client, message):
 
 
 # ─────────────────────────────────────────────
-# 🔍 GROUP SEARCH (WITH ON/OFF CONTROL)
+# 🧵 GROUP TEXT PIPELINE
+# One handler per group text message: chat context is loaded once,
+# then the stages run in order until one of them returns True.
 # ─────────────────────────────────────────────
-@Client.on_message(filters.group & filters.text & filters.incoming)
-async def group_search(client, message):
-    chat_id = message.chat.id
-    user_id = message.from_user.id if message.from_user else 0
-
-    if not user_id:
-        return
-
-    if message.text.startswith("/"):
-        return
+class GroupContext:
+    """Chat context shared by the stages, loaded once per message"""
+
+    def __init__(self, client, message):
+        self.client = client
+        self.message = message
+        self.chat_id = message.chat.id
+        self.user_id = message.from_user.id
+        self.lower = message.text.lower()
+        self.settings = None
+        self.triggers = None
+        self._admin = None
+        self._premium = None
+
+    async def load(self):
+        self.settings = await get_settings(self.chat_id)
+        self.triggers = await get_triggers(self.chat_id)
+
+    async def is_admin(self):
+        if self._admin is None:
+            self._admin = await is_check_admin(self.client, self.chat_id, self.user_id)
+        return self._admin
+
+    async def is_premium(self):
+        if self._premium is None:
+            self._premium = await is_premium(self.user_id, self.client)
+        return self._premium
+
+
+async def search_stage(ctx):
+    """Group search (with on/off control)"""
+    message = ctx.message
 
     # ❌ Ignore forwarded messages
     if message.forward_date:
-        return
-    
-    # ❌ Ignore messages with media
-    if message.photo or message.video or message.document or message.audio or message.voice or message.sticker or message.animation:
-        return
+        return True
     
     # ❌ Ignore messages with links
     if message.entities:
         for entity in message.entities:
             if entity.type in ["url", "text_link", "mention", "text_mention"]:
-                return
+                return True
     
     # ❌ Ignore emoji-only messages (messages without alphanumeric characters)
     text = message.text.strip()
     if not any(c.isalnum() for c in text):
-        return
-
-    # ✅ Check if search is enabled in this group
-    settings = await get_settings(chat_id)
-    search_enabled = settings.get("search_enabled", True)  # Default: ON
-    
-    # If search is OFF, silently ignore all searches (no reply to anyone)
-    if not search_enabled:
-        return
+        return True
 
-    # ✅ Premium check (synced with Premium.py)
-    if IS_PREMIUM and not await is_premium(user_id, client):
-        return
+    # ❌ #notename is answered by the notes handler
+    if re.fullmatch(r"#[a-zA-Z0-9_]+", text):
+        return True
 
-    # admin mention handler
-    if "@admin" in message.text.lower() or "@admins" in message.text.lower():
-        if await is_check_admin(client, chat_id, user_id):
-            return
+    # If search is OFF, silently ignore all searches (no reply to anyone)
+    if not ctx.settings.get("search_enabled", True):  # Default: ON
+        return True
 
-        admins = []
-        async for member in client.get_chat_members(
-            chat_id, enums.ChatMembersFilter.ADMINISTRATORS
-        ):
-            if not member.user.is_bot:
-                admins.append(member.user.id)
+    # 🚦 Rate limit (user and chat) before any DB work
+    blocked = search_throttle(ctx.user_id, ctx.chat_id)
+    if blocked:
+        await throttle_reply(message, blocked)
+        return True
 
-        hidden = "".join(f"[\u2064](tg://user?id={i})" for i in admins)
-        await message.reply_text("Report sent!" + hidden)
-        return
+    # ✅ Premium check (synced with Premium.py)
+    if IS_PREMIUM and not await ctx.is_premium():
+        return True
 
     # block links for non-admins
     if re.findall(r"https?://\S+|www\.\S+|t\.me/\S+|@\w+", message.text):
-        if await is_check_admin(client, chat_id, user_id):
-            return
+        if await ctx.is_admin():
+            return True
         await message.delete()
-        return await message.reply("Links not allowed here!")
+        await message.reply("Links not allowed here!")
+        return True
 
     # Direct ultra-fast search with CASCADE
-    await auto_filter(client, message, collection_type="all")
+    await auto_filter(ctx.client, message, collection_type="all")
+    return True
+
+
+# cheap checks first: moderation, filters, dlink, then search
+GROUP_STAGES = (
+    ("blacklist", blacklist_stage),
+    ("admin_mention", admin_mention_stage),
+    ("filters", filter_stage),
+    ("dlink", dlink_stage),
+    ("search", search_stage)
+)
+
+# stage -> [runs, total seconds, max seconds]
+STAGE_STATS = {name: [0, 0.0, 0.0] for name in ("context",) + tuple(n for n, _ in GROUP_STAGES)}
+
+
+def record_stage(name, started):
+    took = time.perf_counter() - started
+    stat = STAGE_STATS[name]
+    stat[0] += 1
+    stat[1] += took
+    stat[2] = max(stat[2], took)
+
+
+# group=1 so commands and #notes in group 0 are never shadowed
+@Client.on_message(filters.group & filters.text & filters.incoming & ~filters.regex(r"^/"), group=1)
+async def group_text(client, message):
+    if not message.from_user:
+        return
+
+    started = time.perf_counter()
+    ctx = GroupContext(client, message)
+    await ctx.load()
+    record_stage("context", started)
+
+    for name, stage in GROUP_STAGES:
+        started = time.perf_counter()
+        try:
+            stop = await stage(ctx)
+        except Exception as e:
+            print(f"Group stage {name} failed: {e}")
+            stop = False
+        record_stage(name, started)
+        if stop:
+            break
+
+
+@Client.on_message(filters.command("pipeline") & filters.user(ADMINS))
+async def pipeline_stats(client, message):
+    """Per-stage timing of the group text pipeline"""
+    text = "<b>🧵 Group Pipeline</b>\n\n"
+    for name, (runs, total, longest) in STAGE_STATS.items():
+        avg = (total / runs * 1000) if runs else 0
+        text += f"<b>{name}</b>: {runs} runs, avg {avg:.2f} ms, max {longest * 1000:.1f} ms\n"
+    await message.reply(text, parse_mode=enums.ParseMode.HTML)
+
+
+@Client.on_message(filters.command("search_stats") & filters.user(ADMINS))
+async def search_stats(client, message):
+    """
+    Search analytics report
+    Usage: /search_stats [hours] (default 24)
+    """
+    try:
+        hours = int(message.command[1]) if len(message.command) > 1 else 24
+    except ValueError:
+        return await message.reply("Usage: <code>/search_stats [hours]</code>", parse_mode=enums.ParseMode.HTML)
+
+    msg = await message.reply("📈 Building report...")
+    await analytics.flush()
+    report = await asyncio.to_thread(analytics.report, hours)
+    totals = report["totals"]
+    searches = totals["searches"]
+
+    def pct(n, of):
+        return f"{n / of * 100:.1f}%" if of else "0%"
+
+    text = (
+        f"📈 <b>Search Analytics</b> (last {hours}h)\n\n"
+        f"🔍 Searches: <code>{searches}</code>\n"
+        f"❌ Zero hits: <code>{totals['zero']}</code> ({pct(totals['zero'], searches)})\n"
+        f"👤 PM: <code>{totals['origin.pm']}</code> | 👥 Groups: <code>{totals['origin.group']}</code>\n\n"
+        f"<b>📚 Answered by</b>\n"
+    )
+    for tier in ("primary", "cloud", "archive", "prefix", "none"):
+        n = totals[f"tiers.{tier}"]
+        text += f"{tier.title()}: <code>{n}</code> ({pct(n, searches)})\n"
+
+    text += "\n<b>🔥 Top Queries</b>\n"
+    for i, q in enumerate(report["top"], 1):
+        text += f"{i}. <code>{q['_id']}</code> - {q['n']}\n"
+
+    text += "\n<b>🚫 Top Zero-Hit Queries</b>\n"
+    for i, q in enumerate(report["zero"], 1):
+        text += f"{i}. <code>{q['_id']}</code> - {q['n']}\n"
+
+    text += f"\n⏱ {report['took'] * 1000:.0f} ms"
+    await msg.edit_text(text, parse_mode=enums.ParseMode.HTML)
 
 
 # ─────────────────────────────────────────────
@@ -236,7 +397,7 @@ async def navigate_page(bot, query):
             show_alert=True
         )
 
-    search = BUTTONS.get(key)
+    search = await get_search(key)
     if not search:
         return await query.answer("Search expired!", show_alert=True)
 
@@ -254,8 +415,6 @@ async def navigate_page(bot, query):
     if not files:
         return await query.answer("No more results!", show_alert=True)
 
-    temp.FILES[key] = files
-
     # Build results
     files_text = ""
     for file in files:
@@ -350,7 +509,7 @@ async def switch_collection(bot, query):
             show_alert=True
         )
 
-    search = BUTTONS.get(key)
+    search = await get_search(key)
     if not search:
         return await query.answer("Search expired!", show_alert=True)
 
@@ -368,8 +527,6 @@ async def switch_collection(bot, query):
     if not files:
         return await query.answer(f"No results in {collection_type.upper()}!", show_alert=True)
 
-    temp.FILES[key] = files
-
     # Build results
     files_text = ""
     for file in files:
@@ -452,22 +609,28 @@ async def auto_filter(client, msg, collection_type="all"):
     search = message.text.strip()
     
     # Ultra-fast direct search (NO intermediate message) - NOW WITH 4 RETURN VALUES
+    meta = {}
     files, next_offset, total, actual_source = await get_search_results(
         search,
         max_results=MAX_BTN,
         offset=0,
-        collection_type=collection_type
+        collection_type=collection_type,
+        meta=meta
     )
+    # one event per user search (paging / collection switches are not counted)
+    if meta:
+        analytics.record_search(
+            meta["query"], meta["tier"], total,
+            "pm" if message.chat.type == enums.ChatType.PRIVATE else "group"
+        )
 
     if not files:
         k = await message.reply(f"❌ I can't find <b>{search}</b>")
-        await asyncio.sleep(5)
-        await k.delete()
+        schedule_delete(k.chat.id, k.id, 5)
         return
 
     key = f"{message.chat.id}-{message.id}"
-    temp.FILES[key] = files
-    BUTTONS[key] = search
+    await save_search(key, search)
 
     # Build results
     files_text = ""
@@ -525,9 +688,4 @@ async def auto_filter(client, msg, collection_type="all"):
 
     # Auto-delete if enabled
     if settings.get("auto_delete"):
-        await asyncio.sleep(DELETE_TIME)
-        await k.delete()
-        try:
-            await message.delete()
-        except:
-            pass
+        schedule_delete(message.chat.id, [k.id, message.id], DELETE_TIME)
@@ -1,14 +1,29 @@
+import re
+import time
 import asyncio
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from hydrogram import Client, filters, enums
-from hydrogram.types import ChatPermissions
+from hydrogram.types import ChatPermissions, InlineKeyboardMarkup, InlineKeyboardButton
+from hydrogram.errors import FloodWait
 from database.users_chats_db import db
+from utils import (
+    temp,
+    notifier,
+    ADMIN_CACHE_SIZE,
+    schedule_delete,
+    is_check_admin,
+    get_chat_admins,
+    get_settings,
+    save_group_settings
+)
 import pytz
 
 # =========================
 # CONFIG
 # =========================
 MAX_WARNS = 3
+WARN_ACTION = "mute"  # "mute" or "ban" at MAX_WARNS
 AUTO_MUTE_TIME = 600  # 10 minutes
 IST = pytz.timezone('Asia/Kolkata')
 
@@ -17,32 +32,147 @@ IST = pytz.timezone('Asia/Kolkata')
 # =========================
 
 async def is_admin(client, chat_id, user_id):
-    try:
-        member = await client.get_chat_member(chat_id, user_id)
-        return member.status in (
-            enums.ChatMemberStatus.ADMINISTRATOR,
-            enums.ChatMemberStatus.OWNER
-        )
-    except:
-        return False
+    return await is_check_admin(client, chat_id, user_id)
 
 async def warn_user(user_id, chat_id):
-    data = await db.get_warn(user_id, chat_id) or {"count": 0}
-    data["count"] += 1
-    await db.set_warn(user_id, chat_id, data)
-    return data["count"]
+    return await db.add_warn(user_id, chat_id)
 
 async def reset_warn(user_id, chat_id):
     await db.clear_warn(user_id, chat_id)
 
+async def warn_limit_action(client, chat_id, user_id, warns):
+    """Mute / ban once MAX_WARNS is reached, returns what was done"""
+    if warns < MAX_WARNS:
+        return None
+    await reset_warn(user_id, chat_id)
+    if WARN_ACTION == "ban":
+        await client.ban_chat_member(chat_id, user_id)
+        return "banned"
+    until = datetime.utcnow() + timedelta(seconds=AUTO_MUTE_TIME)
+    await client.restrict_chat_member(chat_id, user_id, ChatPermissions(), until_date=until)
+    return f"muted for {AUTO_MUTE_TIME // 60} minutes"
+
 def get_ist_time():
     """Get current time in IST"""
     return datetime.now(IST).strftime('%d-%m-%Y %I:%M:%S %p')
 
+# =========================
+# TRIGGER ENGINE (BLACKLIST / FILTERS / DLINK)
+# =========================
+
+TRIGGER_CACHE_SIZE = 1000
+TRIGGER_CACHE_TIME = 300  # picks up edits made on other replicas
+
+class Matcher:
+    """
+    Many keywords compiled into one regex, so a message is scanned once.
+    With wildcards, `word*` only matches messages starting with `word`.
+    With whole_words, single words match on word boundaries only
+    (phrases still match anywhere). Longer keywords win at a position.
+    Every keyword is its own named group, so `foo*` and `foo` resolve
+    to their own rule.
+    """
+
+    def __init__(self, words, wildcards=True, whole_words=False):
+        alts = []
+        self.keys = {}
+        for i, word in enumerate(sorted(words, key=len, reverse=True)):
+            if wildcards and word.endswith("*"):
+                pattern = "^" + re.escape(word[:-1])
+            elif whole_words and " " not in word:
+                pattern = r"\b" + re.escape(word) + r"\b"
+            else:
+                pattern = re.escape(word)
+            alts.append(f"(?P<k{i}>{pattern})")
+            self.keys[f"k{i}"] = word
+        self.regex = re.compile("|".join(alts)) if alts else None
+
+    def search(self, text):
+        """First keyword found in (lowercased) text, or None"""
+        if not self.regex:
+            return None
+        m = self.regex.search(text)
+        return self.keys[m.lastgroup] if m else None
+
+
+class ChatTriggers:
+    """Compiled blacklist, filters and dlink rules of one chat"""
+
+    def __init__(self, blacklist, blacklist_warn, filters, dlink):
+        self.blacklist = Matcher(blacklist)
+        self.blacklist_warn = blacklist_warn
+        self.filters = filters
+        self.filter_matcher = Matcher(self.filters, wildcards=False, whole_words=True)
+        self.dlink = dlink
+        self.dlink_matcher = Matcher(self.dlink)
+
+
+# chat_id -> (ChatTriggers, expires), rebuilt after a rule command here
+# changes it or after TRIGGER_CACHE_TIME
+TRIGGERS = OrderedDict()
+
+async def get_triggers(chat_id):
+    cached = TRIGGERS.get(chat_id)
+    if cached and cached[1] > time.time():
+        TRIGGERS.move_to_end(chat_id)
+        return cached[0]
+
+    settings = await get_settings(chat_id)
+    triggers = ChatTriggers(
+        await db.get_items("blacklist", chat_id, fields=[]),
+        settings.get("blacklist_warn", True),
+        await db.get_items("filters", chat_id),
+        {w: d["delay"] for w, d in (await db.get_items("dlink", chat_id, fields=["delay"])).items()}
+    )
+    TRIGGERS.pop(chat_id, None)
+    if len(TRIGGERS) >= TRIGGER_CACHE_SIZE:
+        TRIGGERS.popitem(last=False)
+    TRIGGERS[chat_id] = (triggers, time.time() + TRIGGER_CACHE_TIME)
+    return triggers
+
+def invalidate_triggers(chat_id):
+    TRIGGERS.pop(chat_id, None)
+
 # =========================
 # REPORT SYSTEM
 # =========================
 
+REPORT_CONCURRENCY = 20
+CHAT_INFO_TIME = 3600
+
+# {chat_id: (title, username, expires)}
+CHAT_INFO = {}
+
+async def get_chat_info(client, chat_id):
+    """Cached (title, username) of a chat"""
+    cached = CHAT_INFO.get(chat_id)
+    if cached and cached[2] > time.time():
+        return cached[0], cached[1]
+    chat = await client.get_chat(chat_id)
+    if len(CHAT_INFO) >= ADMIN_CACHE_SIZE:
+        CHAT_INFO.pop(next(iter(CHAT_INFO)))
+    CHAT_INFO[chat_id] = (chat.title, chat.username, time.time() + CHAT_INFO_TIME)
+    return chat.title, chat.username
+
+async def send_report(client, admin_id, text, limit):
+    """One report PM through the shared outbound bucket, True on success"""
+    async with limit:
+        for _ in range(2):
+            await notifier.bucket.acquire()
+            try:
+                await client.send_message(
+                    admin_id,
+                    text,
+                    parse_mode=enums.ParseMode.MARKDOWN,
+                    disable_web_page_preview=False
+                )
+                return True
+            except FloodWait as e:
+                notifier.bucket.pause(e.value)
+            except:
+                return False
+        return False
+
 @Client.on_message(filters.group & filters.reply & filters.command(["report", "Report"]))
 async def report_message(client, message):
     """
@@ -60,14 +190,9 @@ async def report_message(client, message):
     if reported_msg.from_user and reported_msg.from_user.id == reporter.id:
         return await message.reply("❌ You cannot report your own message!")
     
-    # Get all admins - FIXED: Use filter parameter correctly
-    admins = []
-    admin_ids = []
+    # Get all admins (cached roster)
     try:
-        async for member in client.get_chat_members(chat_id, filter=enums.ChatMembersFilter.ADMINISTRATORS):
-            if not member.user.is_bot:
-                admins.append(member.user)
-                admin_ids.append(member.user.id)
+        admins = [u for u in (await get_chat_admins(client, chat_id)).values() if not u.is_bot]
     except Exception as e:
         return await message.reply(
             "❌ Failed to get admin list!\n"
@@ -77,11 +202,10 @@ async def report_message(client, message):
     if not admins:
         return await message.reply("❌ No admins found!")
     
-    # Get chat info
+    # Get chat info (cached)
     try:
-        chat = await client.get_chat(chat_id)
-        chat_name = chat.title
-        chat_username = f"@{chat.username}" if chat.username else "Private Group"
+        chat_name, username = await get_chat_info(client, chat_id)
+        chat_username = f"@{username}" if username else "Private Group"
     except:
         chat_name = "Unknown Group"
         chat_username = "N/A"
@@ -139,22 +263,13 @@ async def report_message(client, message):
         f"⏰ **Time:** {get_ist_time()} IST"
     )
     
-    # Send to all admins via PM
-    success_count = 0
-    failed_admins = []
-    
-    for admin in admins:
-        try:
-            await client.send_message(
-                admin.id,
-                report_text,
-                parse_mode=enums.ParseMode.MARKDOWN,
-                disable_web_page_preview=False
-            )
-            success_count += 1
-            await asyncio.sleep(0.1)  # Small delay to avoid flood
-        except Exception as e:
-            failed_admins.append(admin.first_name)
+    # Send to all admins via PM (in parallel, rate limited)
+    limit = asyncio.Semaphore(REPORT_CONCURRENCY)
+    results = await asyncio.gather(*[
+        send_report(client, admin.id, report_text, limit) for admin in admins
+    ])
+    success_count = sum(results)
+    failed_admins = [admin.first_name for admin, ok in zip(admins, results) if not ok]
     
     # Build confirmation message
     if success_count > 0:
@@ -184,41 +299,31 @@ async def report_message(client, message):
         )
     
     # Delete both messages after 10 seconds
-    await asyncio.sleep(10)
-    try:
-        await message.delete()
-        await reply.delete()
-    except:
-        pass
+    schedule_delete(chat_id, [message.id, reply.id], 10)
 
 
-@Client.on_message(filters.group & filters.text & filters.regex(r"@admin|@admins"))
-async def admin_mention_alert(client, message):
+async def admin_mention_stage(ctx):
     """
     Alert admins when @admin or @admins is mentioned
+    (stage of the group text pipeline in filter.py)
     """
-    chat_id = message.chat.id
-    user_id = message.from_user.id if message.from_user else 0
-    
-    if not user_id:
-        return
+    if "@admin" not in ctx.lower:
+        return False
     
     # Skip if user is admin
-    if await is_admin(client, chat_id, user_id):
-        return
+    if await ctx.is_admin():
+        return True
     
-    # Get all admins - FIXED: Use filter parameter correctly
-    admins = []
+    # Get all admins (cached roster)
     try:
-        async for member in client.get_chat_members(chat_id, filter=enums.ChatMembersFilter.ADMINISTRATORS):
-            if not member.user.is_bot:
-                admins.append(member.user.id)
+        admins = [i for i, u in (await get_chat_admins(ctx.client, ctx.chat_id)).items() if not u.is_bot]
     except:
-        return
+        return True
     
     # Send hidden mention to all admins
     hidden = "".join(f"[\u2064](tg://user?id={i})" for i in admins)
-    await message.reply_text("⚠️ Report sent to admins!" + hidden)
+    await ctx.message.reply_text("⚠️ Report sent to admins!" + hidden)
+    return True
 
 # =========================
 # ADMIN MODERATION (REPLY)
@@ -264,6 +369,9 @@ async def warn_cmd(client, message):
         return
     user = message.reply_to_message.from_user
     warns = await warn_user(user.id, message.chat.id)
+    action = await warn_limit_action(client, message.chat.id, user.id, warns)
+    if action:
+        return await message.reply(f"⛔ {user.mention} reached {MAX_WARNS} warnings and was {action}")
     await message.reply(f"⚠️ {user.mention} warned ({warns}/{MAX_WARNS})")
 
 @Client.on_message(filters.group & filters.reply & filters.command("resetwarn"))
@@ -278,88 +386,120 @@ async def resetwarn_cmd(client, message):
 # BLACKLIST SYSTEM
 # =========================
 
-@Client.on_message(filters.group & filters.command("addblacklist"))
+@Client.on_message((filters.group | filters.private) & filters.command("addblacklist"))
 async def add_blacklist(client, message):
-    if not await is_admin(client, message.chat.id, message.from_user.id):
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    if not await is_admin(client, chat_id, message.from_user.id):
         return
     if len(message.command) < 2:
         return
 
     word = message.text.split(None, 1)[1].lower()
-    data = await db.get_settings(message.chat.id) or {}
-
-    blacklist = data.get("blacklist", [])
-    blacklist.append(word)
+    await db.save_item("blacklist", chat_id, word)
+    invalidate_triggers(chat_id)
 
-    data["blacklist"] = list(set(blacklist))
-    data.setdefault("blacklist_warn", True)
-    await db.update_settings(message.chat.id, data)
-
-@Client.on_message(filters.group & filters.command("removeblacklist"))
+@Client.on_message((filters.group | filters.private) & filters.command("removeblacklist"))
 async def remove_blacklist(client, message):
-    if not await is_admin(client, message.chat.id, message.from_user.id):
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    if not await is_admin(client, chat_id, message.from_user.id):
         return
     if len(message.command) < 2:
         return
 
     word = message.text.split(None, 1)[1].lower()
-    data = await db.get_settings(message.chat.id) or {}
-    blacklist = data.get("blacklist", [])
-
-    if word in blacklist:
-        blacklist.remove(word)
-        data["blacklist"] = blacklist
-        await db.update_settings(message.chat.id, data)
+    if await db.delete_item("blacklist", chat_id, word):
+        invalidate_triggers(chat_id)
 
-@Client.on_message(filters.group & filters.command("blacklist"))
+@Client.on_message((filters.group | filters.private) & filters.command("blacklist"))
 async def view_blacklist(client, message):
-    if not await is_admin(client, message.chat.id, message.from_user.id):
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    if not await is_admin(client, chat_id, message.from_user.id):
         return
 
-    data = await db.get_settings(message.chat.id) or {}
-    blacklist = data.get("blacklist", [])
+    blacklist = await db.get_items("blacklist", chat_id, fields=[])
 
     if not blacklist:
         return await message.reply("📭 Blacklist is empty")
 
     await message.reply("\n".join(f"• `{w}`" for w in blacklist))
 
-@Client.on_message(filters.group & filters.command("blacklistwarn"))
+@Client.on_message((filters.group | filters.private) & filters.command("blacklistwarn"))
 async def blacklistwarn(client, message):
-    if not await is_admin(client, message.chat.id, message.from_user.id):
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    if not await is_admin(client, chat_id, message.from_user.id):
         return
     if len(message.command) < 2:
         return
 
-    data = await db.get_settings(message.chat.id) or {}
-    data["blacklist_warn"] = message.command[1] == "on"
-    await db.update_settings(message.chat.id, data)
-
-@Client.on_message(filters.group & filters.text)
-async def blacklist_filter(client, message):
-    if not message.from_user:
-        return
-    if await is_admin(client, message.chat.id, message.from_user.id):
-        return
+    await save_group_settings(chat_id, "blacklist_warn", message.command[1] == "on")
+    invalidate_triggers(chat_id)
 
-    data = await db.get_settings(message.chat.id) or {}
-    blacklist = data.get("blacklist", [])
-    warn_on = data.get("blacklist_warn", True)
-    text = message.text.lower()
+async def blacklist_stage(ctx):
+    """Delete blacklisted messages of non-admins (group text pipeline)"""
+    if not ctx.triggers.blacklist.search(ctx.lower):
+        return False
+    if await ctx.is_admin():
+        return False
 
-    for word in blacklist:
-        if (word.endswith("*") and text.startswith(word[:-1])) or (word in text):
-            await message.delete()
-            if warn_on:
-                await warn_user(message.from_user.id, message.chat.id)
-            return
+    await ctx.message.delete()
+    if ctx.triggers.blacklist_warn:
+        try:
+            warns = await warn_user(ctx.user_id, ctx.chat_id)
+            await warn_limit_action(ctx.client, ctx.chat_id, ctx.user_id, warns)
+        except Exception as e:
+            print(f"Blacklist warn failed: {e}")
+    return True
 
 # =========================
 # CONNECTION SYSTEM (MANAGE FROM DM)
 # =========================
 
-# Store active connections: {user_id: chat_id}
+# Active connections live in Mongo (survive restarts, shared by replicas),
+# fronted by a write-through cache: {user_id: (chat_id or None, expires)}
+# "Not connected" is only cached briefly, so a /connect handled by another
+# replica is seen within NO_CONNECTION_CACHE_TIME.
 CONNECTIONS = {}
+CONNECTION_CACHE_TIME = 300
+NO_CONNECTION_CACHE_TIME = 10
+CONNECTION_CACHE_SIZE = 10000
+
+def cache_connection(user_id, chat_id):
+    CONNECTIONS.pop(user_id, None)
+    if len(CONNECTIONS) >= CONNECTION_CACHE_SIZE:
+        CONNECTIONS.pop(next(iter(CONNECTIONS)))
+    ttl = CONNECTION_CACHE_TIME if chat_id else NO_CONNECTION_CACHE_TIME
+    CONNECTIONS[user_id] = (chat_id, time.time() + ttl)
+
+async def get_connection(user_id):
+    """Connected chat_id of a user or None"""
+    cached = CONNECTIONS.get(user_id)
+    if cached and cached[1] > time.time():
+        return cached[0]
+    chat_id = await db.get_active_connection(user_id)
+    cache_connection(user_id, chat_id)
+    return chat_id
+
+async def set_connection(user_id, chat_id):
+    """Connect (or disconnect with chat_id=None), DB first then cache"""
+    # drop the old entry first, a failed write must not leave it cached
+    CONNECTIONS.pop(user_id, None)
+    if chat_id:
+        await db.set_active_connection(user_id, chat_id)
+        cache_connection(user_id, chat_id)
+    else:
+        await db.clear_active_connection(user_id)
 
 @Client.on_message(filters.command("connect"))
 async def connect_chat(client, message):
@@ -387,13 +527,13 @@ async def connect_chat(client, message):
             f"**Group:** {chat_name}\n"
             f"**Chat ID:** `{chat_id}`\n\n"
             f"**To connect from DM:**\n"
-            f"1. Start bot in DM: @{(await client.get_me()).username}\n"
+            f"1. Start bot in DM: @{temp.U_NAME}\n"
             f"2. Send: `/connect {chat_id}`\n\n"
             f"**Or click button below:**",
             reply_markup=InlineKeyboardMarkup([[
                 InlineKeyboardButton(
                     "🔗 Connect in DM",
-                    url=f"https://t.me/{(await client.get_me()).username}?start=connect_{chat_id}"
+                    url=f"https://t.me/{temp.U_NAME}?start=connect_{chat_id}"
                 )
             ]])
         )
@@ -402,8 +542,8 @@ async def connect_chat(client, message):
     elif message.chat.type == enums.ChatType.PRIVATE:
         if len(message.command) < 2:
             # Show connection status
-            if user_id in CONNECTIONS:
-                connected_chat_id = CONNECTIONS[user_id]
+            connected_chat_id = await get_connection(user_id)
+            if connected_chat_id:
                 try:
                     chat = await client.get_chat(connected_chat_id)
                     await message.reply(
@@ -414,7 +554,7 @@ async def connect_chat(client, message):
                     )
                 except:
                     # Chat not accessible
-                    del CONNECTIONS[user_id]
+                    await set_connection(user_id, None)
                     await message.reply(
                         "❌ Connection expired or group not accessible.\n\n"
                         "Use `/connect <chat_id>` to reconnect"
@@ -462,7 +602,7 @@ async def connect_chat(client, message):
             return await message.reply("❌ Could not get group info!")
         
         # Store connection
-        CONNECTIONS[user_id] = chat_id
+        await set_connection(user_id, chat_id)
         
         await message.reply(
             f"✅ **Connected Successfully!**\n\n"
@@ -483,22 +623,21 @@ async def disconnect_chat(client, message):
     Usage: /disconnect (in DM)
     """
     user_id = message.from_user.id
+    chat_id = await get_connection(user_id)
     
-    if user_id not in CONNECTIONS:
+    if not chat_id:
         return await message.reply(
             "📭 **Not Connected**\n\n"
             "You're not connected to any group."
         )
     
-    chat_id = CONNECTIONS[user_id]
-    
     try:
         chat = await client.get_chat(chat_id)
         chat_name = chat.title
     except:
         chat_name = "Unknown Group"
     
-    del CONNECTIONS[user_id]
+    await set_connection(user_id, None)
     
     await message.reply(
         f"✅ **Disconnected!**\n\n"
@@ -514,24 +653,22 @@ async def connection_status(client, message):
     Usage: /connection (in DM)
     """
     user_id = message.from_user.id
+    chat_id = await get_connection(user_id)
     
-    if user_id not in CONNECTIONS:
+    if not chat_id:
         return await message.reply(
             "📭 **Not Connected**\n\n"
             "Use `/connect <chat_id>` to connect to a group"
         )
     
-    chat_id = CONNECTIONS[user_id]
-    
     try:
         chat = await client.get_chat(chat_id)
         
         # Get group stats
-        data = await db.get_settings(chat_id) or {}
-        notes_count = len(data.get("notes", {}))
-        filters_count = len(data.get("filters", {}))
-        blacklist_count = len(data.get("blacklist", []))
-        dlink_count = len(data.get("dlink", {}))
+        notes_count = await db.count_items("notes", chat_id)
+        filters_count = await db.count_items("filters", chat_id)
+        blacklist_count = await db.count_items("blacklist", chat_id)
+        dlink_count = await db.count_items("dlink", chat_id)
         
         await message.reply(
             f"🔗 **Connection Status**\n"
@@ -548,14 +685,19 @@ async def connection_status(client, message):
             f"⏰ {get_ist_time()} IST"
         )
     except:
-        del CONNECTIONS[user_id]
+        await set_connection(user_id, None)
         await message.reply(
             "❌ Connection expired or group not accessible.\n\n"
             "Use `/connect <chat_id>` to reconnect"
         )
 
+NOT_CONNECTED = (
+    "📭 **Not Connected**\n\n"
+    "Use `/connect <chat_id>` to manage a group from here"
+)
+
 # Helper function to get chat_id (from connection or message)
-def get_target_chat_id(message):
+async def get_target_chat_id(message):
     """Get target chat_id - either from connection (DM) or current chat (group)"""
     user_id = message.from_user.id
     
@@ -565,7 +707,7 @@ def get_target_chat_id(message):
     
     # If in DM, use connected chat_id
     if message.chat.type == enums.ChatType.PRIVATE:
-        return CONNECTIONS.get(user_id)
+        return await get_connection(user_id)
     
     return None
 
@@ -573,7 +715,7 @@ def get_target_chat_id(message):
 # FILTERS SYSTEM (AUTO REPLY)
 # =========================
 
-@Client.on_message(filters.group & filters.command("filter"))
+@Client.on_message((filters.group | filters.private) & filters.command("filter"))
 async def add_filter(client, message):
     """
     Add auto-reply filter
@@ -582,7 +724,11 @@ async def add_filter(client, message):
       /filter "ram jaane" <reply text> (for phrases with spaces)
       or reply to a message with /filter <keyword>
     """
-    if not await is_admin(client, message.chat.id, message.from_user.id):
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    if not await is_admin(client, chat_id, message.from_user.id):
         return await message.reply("❌ Admin only command!")
     
     # Check if replying to a message
@@ -663,19 +809,14 @@ async def add_filter(client, message):
         filter_caption = ""
     
     # Save to database
-    data = await db.get_settings(chat_id) or {}
-    filters = data.get("filters", {})
-    
-    filters[keyword] = {
+    await db.save_item("filters", chat_id, keyword, {
         "content": filter_content,
         "type": filter_type,
         "caption": filter_caption,
         "added_by": message.from_user.id,
         "added_at": get_ist_time()
-    }
-    
-    data["filters"] = filters
-    await db.update_settings(chat_id, data)
+    })
+    invalidate_triggers(chat_id)
     
     # Show keyword with quotes if it has spaces
     display_keyword = f'"{keyword}"' if " " in keyword else keyword
@@ -699,14 +840,17 @@ async def add_filter(client, message):
         f"**Trigger:** Send a message containing `{display_keyword}`"
     )
 
-@Client.on_message(filters.group & filters.command("filters"))
+@Client.on_message((filters.group | filters.private) & filters.command("filters"))
 async def list_filters(client, message):
     """
     List all filters
     Usage: /filters
     """
-    data = await db.get_settings(message.chat.id) or {}
-    filters_dict = data.get("filters", {})
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    filters_dict = await db.get_items("filters", chat_id, fields=["type"])
     
     if not filters_dict:
         return await message.reply(
@@ -740,13 +884,17 @@ async def list_filters(client, message):
     
     await message.reply(filters_text)
 
-@Client.on_message(filters.group & filters.command("stop"))
+@Client.on_message((filters.group | filters.private) & filters.command("stop"))
 async def delete_filter(client, message):
     """
     Delete a filter
     Usage: /stop <keyword>
     """
-    if not await is_admin(client, message.chat.id, message.from_user.id):
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    if not await is_admin(client, chat_id, message.from_user.id):
         return await message.reply("❌ Admin only command!")
     
     if len(message.command) < 2:
@@ -757,18 +905,12 @@ async def delete_filter(client, message):
     
     keyword = message.command[1].lower()
     
-    data = await db.get_settings(message.chat.id) or {}
-    filters_dict = data.get("filters", {})
-    
-    if keyword not in filters_dict:
+    if not await db.delete_item("filters", chat_id, keyword):
         return await message.reply(
             f"❌ **Filter Not Found!**\n\n"
             f"`{keyword}` filter doesn't exist."
         )
-    
-    filters_dict.pop(keyword)
-    data["filters"] = filters_dict
-    await db.update_settings(message.chat.id, data)
+    invalidate_triggers(chat_id)
     
     await message.reply(
         f"🗑️ **Filter Deleted!**\n\n"
@@ -777,13 +919,17 @@ async def delete_filter(client, message):
         f"⏰ {get_ist_time()} IST"
     )
 
-@Client.on_message(filters.group & filters.command("stopall"))
+@Client.on_message((filters.group | filters.private) & filters.command("stopall"))
 async def delete_all_filters(client, message):
     """
     Delete all filters
     Usage: /stopall confirm
     """
-    if not await is_admin(client, message.chat.id, message.from_user.id):
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    if not await is_admin(client, chat_id, message.from_user.id):
         return await message.reply("❌ Admin only command!")
     
     if len(message.command) < 2 or message.command[1].lower() != "confirm":
@@ -793,11 +939,8 @@ async def delete_all_filters(client, message):
             "`/stopall confirm`"
         )
     
-    data = await db.get_settings(message.chat.id) or {}
-    filters_count = len(data.get("filters", {}))
-    
-    data["filters"] = {}
-    await db.update_settings(message.chat.id, data)
+    filters_count = await db.delete_items("filters", chat_id)
+    invalidate_triggers(chat_id)
     
     await message.reply(
         f"🗑️ **All Filters Deleted!**\n\n"
@@ -806,87 +949,57 @@ async def delete_all_filters(client, message):
         f"⏰ {get_ist_time()} IST"
     )
 
-@Client.on_message(filters.group & filters.text, group=5)
-async def filter_handler(client, message):
+async def filter_stage(ctx):
     """
-    Auto-reply when filter keyword is detected
+    Auto-reply when filter keyword is detected (group text pipeline)
     Supports both single words and exact phrases (with quotes)
-    Priority: group=5 (runs before dlink handler)
     """
-    # Skip if no text
-    if not message.text:
-        return
-    
-    # Skip commands
-    if message.text.startswith("/"):
-        return
-    
-    # Skip if admin typing filter commands
-    if message.text.startswith(("/filter", "/stop", "/filters", "/stopall")):
-        return
-    
-    data = await db.get_settings(message.chat.id) or {}
-    filters_dict = data.get("filters", {})
-    
-    if not filters_dict:
-        return
+    message = ctx.message
+    # Phrases match anywhere, single words on word boundaries
+    # ("hi" matches "hi" or "hi there" but not "this")
+    keyword = ctx.triggers.filter_matcher.search(ctx.lower)
+    if not keyword:
+        return False
     
-    text = message.text.lower()
+    filter_data = ctx.triggers.filters[keyword]
+    filter_type = filter_data["type"]
+    filter_content = filter_data["content"]
+    filter_caption = filter_data.get("caption", "")
     
-    # Check for keyword match
-    for keyword, filter_data in filters_dict.items():
-        matched = False
-        
-        # Check if keyword has spaces (phrase)
-        if " " in keyword:
-            # Exact phrase match for multi-word keywords
-            if keyword in text:
-                matched = True
-        else:
-            # Word boundary match for single words
-            # This ensures "hi" matches "hi" or "hi there" but not "this"
-            import re
-            pattern = r'\b' + re.escape(keyword) + r'\b'
-            if re.search(pattern, text):
-                matched = True
-        
-        if matched:
-            filter_type = filter_data["type"]
-            filter_content = filter_data["content"]
-            filter_caption = filter_data.get("caption", "")
-            
-            try:
-                if filter_type == "text":
-                    await message.reply(filter_content)
-                elif filter_type == "photo":
-                    await message.reply_photo(filter_content, caption=filter_caption)
-                elif filter_type == "video":
-                    await message.reply_video(filter_content, caption=filter_caption)
-                elif filter_type == "document":
-                    await message.reply_document(filter_content, caption=filter_caption)
-                elif filter_type == "sticker":
-                    await message.reply_sticker(filter_content)
-                elif filter_type == "animation":
-                    await message.reply_animation(filter_content, caption=filter_caption)
-            except Exception as e:
-                # Silently fail if filter can't be sent
-                pass
-            
-            # Only reply to first matched filter
-            break
+    try:
+        if filter_type == "text":
+            await message.reply(filter_content)
+        elif filter_type == "photo":
+            await message.reply_photo(filter_content, caption=filter_caption)
+        elif filter_type == "video":
+            await message.reply_video(filter_content, caption=filter_caption)
+        elif filter_type == "document":
+            await message.reply_document(filter_content, caption=filter_caption)
+        elif filter_type == "sticker":
+            await message.reply_sticker(filter_content)
+        elif filter_type == "animation":
+            await message.reply_animation(filter_content, caption=filter_caption)
+    except Exception as e:
+        # Silently fail if filter can't be sent
+        pass
+    return False
 
 # =========================
 # NOTES SYSTEM
 # =========================
 
-@Client.on_message(filters.group & filters.command("save"))
+@Client.on_message((filters.group | filters.private) & filters.command("save"))
 async def save_note(client, message):
     """
     Save a note
     Usage: /save <notename> <content>
     or reply to a message with /save <notename>
     """
-    if not await is_admin(client, message.chat.id, message.from_user.id):
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    if not await is_admin(client, chat_id, message.from_user.id):
         return await message.reply("❌ Admin only command!")
     
     # Check if replying to a message
@@ -943,19 +1056,13 @@ async def save_note(client, message):
         note_caption = ""
     
     # Save to database
-    data = await db.get_settings(message.chat.id) or {}
-    notes = data.get("notes", {})
-    
-    notes[note_name] = {
+    await db.save_item("notes", chat_id, note_name, {
         "content": note_content,
         "type": note_type,
         "caption": note_caption if note_type != "text" else "",
         "added_by": message.from_user.id,
         "added_at": get_ist_time()
-    }
-    
-    data["notes"] = notes
-    await db.update_settings(message.chat.id, data)
+    })
     
     await message.reply(
         f"✅ **Note Saved!**\n\n"
@@ -992,17 +1099,15 @@ async def get_note_hashtag(client, message):
 
 async def send_note(client, message, note_name):
     """Helper function to send a note"""
-    data = await db.get_settings(message.chat.id) or {}
-    notes = data.get("notes", {})
+    note = await db.get_item("notes", message.chat.id, note_name)
     
-    if note_name not in notes:
+    if not note:
         return await message.reply(
             f"❌ **Note Not Found!**\n\n"
             f"`#{note_name}` doesn't exist.\n\n"
             f"Use `/notes` to see all saved notes."
         )
     
-    note = notes[note_name]
     note_type = note["type"]
     note_content = note["content"]
     note_caption = note.get("caption", "")
@@ -1027,14 +1132,17 @@ async def send_note(client, message, note_name):
             f"Error: `{str(e)}`"
         )
 
-@Client.on_message(filters.group & filters.command("notes"))
+@Client.on_message((filters.group | filters.private) & filters.command("notes"))
 async def list_notes(client, message):
     """
     List all saved notes
     Usage: /notes
     """
-    data = await db.get_settings(message.chat.id) or {}
-    notes = data.get("notes", {})
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    notes = await db.get_items("notes", chat_id, fields=["type"])
     
     if not notes:
         return await message.reply(
@@ -1069,13 +1177,17 @@ async def list_notes(client, message):
     
     await message.reply(notes_text)
 
-@Client.on_message(filters.group & filters.command("clear"))
+@Client.on_message((filters.group | filters.private) & filters.command("clear"))
 async def delete_note(client, message):
     """
     Delete a note
     Usage: /clear <notename>
     """
-    if not await is_admin(client, message.chat.id, message.from_user.id):
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    if not await is_admin(client, chat_id, message.from_user.id):
         return await message.reply("❌ Admin only command!")
     
     if len(message.command) < 2:
@@ -1086,19 +1198,12 @@ async def delete_note(client, message):
     
     note_name = message.command[1].lower()
     
-    data = await db.get_settings(message.chat.id) or {}
-    notes = data.get("notes", {})
-    
-    if note_name not in notes:
+    if not await db.delete_item("notes", chat_id, note_name):
         return await message.reply(
             f"❌ **Note Not Found!**\n\n"
             f"`#{note_name}` doesn't exist."
         )
     
-    notes.pop(note_name)
-    data["notes"] = notes
-    await db.update_settings(message.chat.id, data)
-    
     await message.reply(
         f"🗑️ **Note Deleted!**\n\n"
         f"**Name:** `#{note_name}`\n"
@@ -1106,13 +1211,17 @@ async def delete_note(client, message):
         f"⏰ {get_ist_time()} IST"
     )
 
-@Client.on_message(filters.group & filters.command("clearall"))
+@Client.on_message((filters.group | filters.private) & filters.command("clearall"))
 async def delete_all_notes(client, message):
     """
     Delete all notes
     Usage: /clearall confirm
     """
-    if not await is_admin(client, message.chat.id, message.from_user.id):
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    if not await is_admin(client, chat_id, message.from_user.id):
         return await message.reply("❌ Admin only command!")
     
     if len(message.command) < 2 or message.command[1].lower() != "confirm":
@@ -1122,11 +1231,7 @@ async def delete_all_notes(client, message):
             "`/clearall confirm`"
         )
     
-    data = await db.get_settings(message.chat.id) or {}
-    notes_count = len(data.get("notes", {}))
-    
-    data["notes"] = {}
-    await db.update_settings(message.chat.id, data)
+    notes_count = await db.delete_items("notes", chat_id)
     
     await message.reply(
         f"🗑️ **All Notes Deleted!**\n\n"
@@ -1139,7 +1244,7 @@ async def delete_all_notes(client, message):
 # DLINK (DELAYED DELETE) - IMPROVED
 # =========================
 
-@Client.on_message(filters.group & filters.command("dlink"))
+@Client.on_message((filters.group | filters.private) & filters.command("dlink"))
 async def add_dlink(client, message):
     """
     Add delayed delete rule
@@ -1148,7 +1253,11 @@ async def add_dlink(client, message):
       /dlink 10m <word> - Delete after 10 minutes
       /dlink 2h <word> - Delete after 2 hours
     """
-    if not await is_admin(client, message.chat.id, message.from_user.id):
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    if not await is_admin(client, chat_id, message.from_user.id):
         return await message.reply("❌ Admin only command!")
 
     args = message.text.split()
@@ -1182,12 +1291,8 @@ async def add_dlink(client, message):
     if not word:
         return await message.reply("❌ Please provide a word/phrase to track!")
     
-    data = await db.get_settings(message.chat.id) or {}
-    dlink = data.get("dlink", {})
-
-    dlink[word] = delay
-    data["dlink"] = dlink
-    await db.update_settings(message.chat.id, data)
+    await db.save_item("dlink", chat_id, word, {"delay": delay})
+    invalidate_triggers(chat_id)
     
     # Format delay for display
     if delay < 3600:
@@ -1202,10 +1307,14 @@ async def add_dlink(client, message):
         f"⏰ Added at: {get_ist_time()} IST"
     )
 
-@Client.on_message(filters.group & filters.command("removedlink"))
+@Client.on_message((filters.group | filters.private) & filters.command("removedlink"))
 async def remove_dlink(client, message):
     """Remove delayed delete rule"""
-    if not await is_admin(client, message.chat.id, message.from_user.id):
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    if not await is_admin(client, chat_id, message.from_user.id):
         return await message.reply("❌ Admin only command!")
 
     if len(message.command) < 2:
@@ -1215,19 +1324,13 @@ async def remove_dlink(client, message):
         )
 
     word = message.text.split(None, 1)[1].lower()
-    data = await db.get_settings(message.chat.id) or {}
-    dlink = data.get("dlink", {})
-
-    if word not in dlink:
+    if not await db.delete_item("dlink", chat_id, word):
         return await message.reply(
             f"❌ **Not Found!**\n\n"
             f"`{word}` is not in dlink list.\n\n"
             f"Use `/dlinklist` to view all rules."
         )
-
-    dlink.pop(word, None)
-    data["dlink"] = dlink
-    await db.update_settings(message.chat.id, data)
+    invalidate_triggers(chat_id)
     
     await message.reply(
         f"✅ **Dlink Rule Removed!**\n\n"
@@ -1235,14 +1338,17 @@ async def remove_dlink(client, message):
         f"⏰ Removed at: {get_ist_time()} IST"
     )
 
-@Client.on_message(filters.group & filters.command("dlinklist"))
+@Client.on_message((filters.group | filters.private) & filters.command("dlinklist"))
 async def dlink_list(client, message):
     """View all delayed delete rules"""
-    if not await is_admin(client, message.chat.id, message.from_user.id):
+    chat_id = await get_target_chat_id(message)
+    if not chat_id:
+        return await message.reply(NOT_CONNECTED)
+    
+    if not await is_admin(client, chat_id, message.from_user.id):
         return await message.reply("❌ Admin only command!")
 
-    data = await db.get_settings(message.chat.id) or {}
-    dlink = data.get("dlink", {})
+    dlink = await db.get_items("dlink", chat_id, fields=["delay"])
 
     if not dlink:
         return await message.reply(
@@ -1254,7 +1360,8 @@ async def dlink_list(client, message):
     # Format list
     dlink_text = "📋 **Delayed Delete Rules**\n" + "━" * 30 + "\n\n"
     
-    for idx, (word, delay) in enumerate(dlink.items(), 1):
+    for idx, (word, rule) in enumerate(dlink.items(), 1):
+        delay = rule["delay"]
         if delay < 3600:
             delay_str = f"{delay // 60}m"
         else:
@@ -1268,47 +1375,18 @@ async def dlink_list(client, message):
 
     await message.reply(dlink_text)
 
-@Client.on_message(filters.group & filters.text, group=10)
-async def silent_dlink_handler(client, message):
+async def dlink_stage(ctx):
     """
     Silently delete messages containing dlink words after delay
     Works for ALL users including admins (basic feature)
-    Priority: group=10 (runs after other handlers)
     """
-    # Skip if no text
-    if not message.text:
-        return
-    
-    data = await db.get_settings(message.chat.id) or {}
-    dlink = data.get("dlink", {})
-    
-    if not dlink:
-        return
-    
-    text = message.text.lower()
-
-    for word, delay in dlink.items():
-        # Match logic: exact match or wildcard
-        matched = False
-        
-        if word.endswith("*"):
-            # Wildcard: "movie*" matches "movie", "movies", etc.
-            if text.startswith(word[:-1]):
-                matched = True
-        else:
-            # Exact word match (as whole word or part of text)
-            if word in text:
-                matched = True
-        
-        if matched:
-            # Schedule deletion
-            await asyncio.sleep(delay)
-            try:
-                await message.delete()
-            except Exception as e:
-                # Message might be already deleted or bot lacks permission
-                pass
-            return  # Only delete once per message
+    # Wildcard "movie*" matches texts starting with "movie",
+    # other words match anywhere in the text
+    word = ctx.triggers.dlink_matcher.search(ctx.lower)
+    if word:
+        # Schedule deletion
+        schedule_delete(ctx.chat_id, ctx.message.id, ctx.triggers.dlink[word])
+    return False
 
 # =========================
 # ANTI BOT PROTECTION
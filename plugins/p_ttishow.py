@@ -1,15 +1,61 @@
-import random
 import os
 import sys
+import csv
+import gzip
+import json
+import time
+import random
+import asyncio
+import tempfile
 from hydrogram import Client, filters, enums
-from hydrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-from hydrogram.errors.exceptions.bad_request_400 import MessageTooLong
+from hydrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
 from info import ADMINS, LOG_CHANNEL, PICS
 from database.users_chats_db import db
-from utils import temp, get_settings
+from utils import temp, get_settings, invalidate_admins, ADMIN_STATUSES
 from Script import script
 
 
+# ─────────────────────────────────────────────
+# 🚫 BANNED USERS / DISABLED CHATS
+# Runs before every other handler group and stops propagation,
+# so banned traffic never reaches search or the database.
+# ─────────────────────────────────────────────
+def _is_banned(_, __, update):
+    user = update.from_user
+    if user and user.id in ADMINS:
+        return False
+    if user and user.id in temp.BANNED_USERS:
+        return True
+    chat = update.message.chat if isinstance(update, CallbackQuery) and update.message else getattr(update, "chat", None)
+    return bool(chat and chat.id in temp.BANNED_CHATS)
+
+
+banned = filters.create(_is_banned)
+
+
+@Client.on_message(banned, group=-100)
+async def drop_banned_message(bot, message):
+    message.stop_propagation()
+
+
+@Client.on_callback_query(banned, group=-100)
+async def drop_banned_query(bot, query):
+    try:
+        await query.answer("You are banned from using this bot.", show_alert=True)
+    except:
+        pass
+    query.stop_propagation()
+
+
+@Client.on_chat_member_updated(group=-1)
+async def admin_changes(bot, update):
+    """Promotions / demotions / admins leaving drop the cached admin list"""
+    old = update.old_chat_member
+    new = update.new_chat_member
+    if (old and old.status in ADMIN_STATUSES) or (new and new.status in ADMIN_STATUSES):
+        invalidate_admins(update.chat.id)
+
+
 @Client.on_chat_member_updated()
 async def welcome(bot, message):
     if message.chat.type not in [enums.ChatType.GROUP, enums.ChatType.SUPERGROUP]:
@@ -92,7 +138,7 @@ async def disable_chat(bot, message):
     if cha_t['is_disabled']:
         return await message.reply(f"This chat is already disabled.\nReason - <code>{cha_t['reason']}</code>")
     await db.disable_chat(int(chat_), reason)
-    temp.BANNED_CHATS.append(int(chat_))
+    temp.BANNED_CHATS.add(int(chat_))
     await message.reply('Chat successfully disabled')
     try:
         await bot.send_message(
@@ -117,7 +163,7 @@ async def re_enable_chat(bot, message):
     if not sts.get('is_disabled'):
         return await message.reply('This chat is not yet disabled.')
     await db.re_enable_chat(int(chat_))
-    temp.BANNED_CHATS.remove(int(chat_))
+    temp.BANNED_CHATS.discard(int(chat_))
     await message.reply("Chat successfully re-enabled")
 
 @Client.on_message(filters.command('invite_link') & filters.user(ADMINS))
@@ -161,7 +207,7 @@ async def ban_a_user(bot, message):
         if jar['is_banned']:
             return await message.reply(f"{k.mention} is already banned.\nReason - <code>{jar['ban_reason']}</code>")
         await db.ban_user(k.id, reason)
-        temp.BANNED_USERS.append(k.id)
+        temp.BANNED_USERS.add(k.id)
         await message.reply(f"Successfully banned {k.mention}")
    
 @Client.on_message(filters.command('unban_user') & filters.user(ADMINS))
@@ -186,43 +232,66 @@ async def unban_a_user(bot, message):
         if not jar['is_banned']:
             return await message.reply(f"{k.mention} is not yet banned.")
         await db.remove_ban(k.id)
-        temp.BANNED_USERS.remove(k.id)
+        temp.BANNED_USERS.discard(k.id)
         await message.reply(f"Successfully unbanned {k.mention}")
     
-@Client.on_message(filters.command('users') & filters.user(ADMINS))
-async def list_users(bot, message):
-    raju = await message.reply('Getting list of users')
-    users = await db.get_all_users()
-    out = "Users saved in database are:\n\n"
-    for user in users:
-        out += f"**Name:** {user['name']}\n**ID:** `{user['id']}`"
-        if user['ban_status']['is_banned']:
-            out += ' (Banned User)'
-        out += '\n\n'
-    try:
-        await raju.edit_text(out)
-    except MessageTooLong:
-        with open('users.txt', 'w+') as outfile:
-            outfile.write(out)
-        await message.reply_document('users.txt', caption="List of users")
-        await raju.delete()
-        os.remove('users.txt')
-
-@Client.on_message(filters.command('chats') & filters.user(ADMINS))
-async def list_chats(bot, message):
-    raju = await message.reply('Getting list of chats')
-    chats = await db.get_all_chats()
-    out = "Chats saved in database are:\n\n"
-    for chat in chats:
-        out += f"**Title:** {chat['title']}\n**ID:** `{chat['id']}`"
-        if chat['chat_status']['is_disabled']:
-            out += ' (Disabled Chat)'
-        out += '\n\n'
+# ─────────────────────────────────────────────
+# 📤 USER / CHAT EXPORTS
+# Streamed from a projected cursor into a gzip file in a worker thread,
+# so memory stays flat however many rows there are.
+# ─────────────────────────────────────────────
+EXPORT_COLUMNS = {
+    "users": ("id", "name", "banned"),
+    "chats": ("id", "title", "disabled")
+}
+
+
+def export_rows(kind):
+    for doc in db.export_cursor(kind):
+        if kind == "users":
+            yield doc.get("id"), doc.get("name", ""), doc.get("ban_status", {}).get("is_banned", False)
+        else:
+            yield doc.get("id"), doc.get("title", ""), doc.get("chat_status", {}).get("is_disabled", False)
+
+
+def write_export(kind, fmt, path):
+    """Write the export file, returns the row count"""
+    columns = EXPORT_COLUMNS[kind]
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in export_rows(kind):
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in export_rows(kind):
+                f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n")
+                count += 1
+    return count
+
+
+@Client.on_message(filters.command(['users', 'chats']) & filters.user(ADMINS))
+async def export_list(bot, message):
+    """/users [csv|jsonl] and /chats [csv|jsonl]"""
+    kind = message.command[0].lower()
+    fmt = message.command[1].lower() if len(message.command) > 1 else "csv"
+    if fmt not in ("csv", "jsonl"):
+        return await message.reply(f"Usage: <code>/{kind} [csv|jsonl]</code>", parse_mode=enums.ParseMode.HTML)
+
+    raju = await message.reply(f'Exporting {kind}...')
+    path = os.path.join(tempfile.gettempdir(), f"{kind}_{message.id}.{fmt}.gz")
     try:
-        await raju.edit_text(out)
-    except MessageTooLong:
-        with open('chats.txt', 'w+') as outfile:
-            outfile.write(out)
-        await message.reply_document('chats.txt', caption="List of chats")
+        started = time.time()
+        count = await asyncio.to_thread(write_export, kind, fmt, path)
+        await message.reply_document(
+            path,
+            caption=f"{count} {kind} exported in {time.time() - started:.1f}s"
+        )
         await raju.delete()
-        os.remove('chats.txt')
+    except Exception as e:
+        await raju.edit_text(f"Export failed: {e}")
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
@@ -1,7 +1,9 @@
 import os
+import heapq
 import qrcode
 import random
 import asyncio
+import itertools
 from datetime import datetime, timedelta
 from hydrogram import Client, filters, enums
 from hydrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message, CallbackQuery
@@ -17,191 +19,185 @@ from info import (
     LOG_CHANNEL
 )
 from Script import script
-from utils import temp
+from utils import temp, is_premium, parse_expire_time, notify
 
 # Global variable for trial status (default OFF)
 TRIAL_ENABLED = False
 
 
 # ─────────────────────────────────────────────
-# 🔧 HELPER: Convert expire to datetime
+# ⏰ PREMIUM EXPIRY CHECKER & REMINDER
 # ─────────────────────────────────────────────
-def parse_expire_time(expire):
+# (flag, hours before expiry, message)
+REMINDERS = (
+    (
+        "reminded_24h", 24,
+        "⏰ <b>Premium Expiry Reminder</b>\n\n"
+        "Your premium {plan} plan will expire in 24 hours.\n"
+        "Expiry time: {expire}\n\n"
+        "Use /plan to renew your subscription."
+    ),
+    (
+        "reminded_6h", 6,
+        "⚠️ <b>Premium Expiry Alert</b>\n\n"
+        "Your premium {plan} plan will expire in 6 hours.\n"
+        "Expiry time: {expire}\n\n"
+        "Use /plan to renew now!"
+    ),
+    (
+        "reminded_1h", 1,
+        "🚨 <b>URGENT: Premium Expiring Soon</b>\n\n"
+        "Your premium {plan} plan will expire in 1 hour!\n"
+        "Expiry time: {expire}\n\n"
+        "Renew immediately to avoid service interruption: /plan"
+    )
+)
+REMINDER_TEXT = {flag: text for flag, _, text in REMINDERS}
+
+LOOKAHEAD = timedelta(hours=25)  # must cover the earliest reminder
+REFRESH = timedelta(hours=1)
+REMINDER_GRACE = timedelta(minutes=30)  # late reminders still sent after a restart
+
+
+class PremiumScheduler:
     """
-    Convert expire field to datetime object
-    Handles both string and datetime formats
+    Fires expiry reminders and expiries at their exact time.
+
+    Only plans expiring within LOOKAHEAD are loaded (indexed query) into a
+    min-heap, reloaded every REFRESH. Plan writes reach us through
+    db.plan_listeners, so changes are rescheduled as they happen.
     """
-    if not expire:
-        return None
-    
-    if isinstance(expire, datetime):
-        return expire
-    
-    if isinstance(expire, str):
-        try:
-            from dateutil import parser
-            return parser.parse(expire)
-        except:
-            return None
-    
-    return None
 
+    def __init__(self):
+        self.heap = []  # (fire_at, seq, user_id, version, kind, expire)
+        self.seq = itertools.count()
+        self.versions = {}
+        self.changed = set()
+        self.wakeup = asyncio.Event()
+        self.next_refresh = None
+
+    def plan_changed(self, user_id):
+        self.changed.add(user_id)
+        self.wakeup.set()
+
+    def schedule(self, user_id, mp):
+        """(Re)schedule all pending events of one plan"""
+        version = self.versions.get(user_id, 0) + 1
+        self.versions[user_id] = version
+
+        expire = parse_expire_time(mp.get("expire"))
+        if not mp.get("premium") or not expire:
+            return
+        if expire > datetime.now() + LOOKAHEAD:
+            return  # picked up by a later refresh
+
+        now = datetime.now()
+        for flag, hours, _ in REMINDERS:
+            fire_at = expire - timedelta(hours=hours)
+            if mp.get(flag) or fire_at + REMINDER_GRACE < now:
+                continue
+            heapq.heappush(self.heap, (fire_at, next(self.seq), user_id, version, flag, expire))
+        heapq.heappush(self.heap, (expire, next(self.seq), user_id, version, "expire", expire))
+
+    def rebuild(self):
+        self.heap = []
+        self.versions = {}
+        migrate_string_expiry()
+        for p in db.get_expiring_plans(datetime.now() + LOOKAHEAD):
+            self.schedule(p["id"], p.get("status", {}))
+        self.next_refresh = datetime.now() + REFRESH
+
+    async def fire(self, bot, user_id, kind, expire):
+        # re-read: the plan may have been extended or removed meanwhile
+        mp = db.get_plan(user_id)
+        if not mp.get("premium") or parse_expire_time(mp.get("expire")) != expire:
+            return
+        expire_str = expire.strftime('%Y-%m-%d %H:%M:%S')
+
+        if kind == "expire":
+            notify(
+                user_id,
+                f"❌ Your premium {mp.get('plan')} plan has expired.\n\n"
+                f"Expired on: {expire_str}\n\n"
+                f"Use /plan to renew your subscription."
+            )
 
-# ─────────────────────────────────────────────
-# 💎 PREMIUM CHECK (Synced with utils.py)
-# ─────────────────────────────────────────────
-async def is_premium(user_id, bot):
-    """Check if user has active premium subscription"""
-    if not IS_PREMIUM:
-        return True
-    if user_id in ADMINS:
-        return True
+            plan_name = mp.get('plan', 'Unknown')
+            mp.update({
+                "expire": None,
+                "plan": "",
+                "premium": False
+            })
+            db.update_plan(user_id, mp)
 
-    mp = db.get_plan(user_id)
-    if mp.get("premium"):
-        expire = mp.get("expire")
-        
-        # ✅ Convert to datetime if needed
-        expire_dt = parse_expire_time(expire)
-        
-        if expire_dt:
-            # Check if expired
-            if expire_dt < datetime.now():
-                try:
-                    await bot.send_message(
-                        user_id,
-                        f"❌ Your premium {mp.get('plan')} plan has expired.\n\nUse /plan to renew your subscription."
-                    )
-                except Exception:
-                    pass
-
-                mp.update({
-                    "expire": "",
-                    "plan": "",
-                    "premium": False
-                })
-                db.update_plan(user_id, mp)
-                return False
-        
-        return True
-    return False
+            # Log to admin channel
+            notify(
+                LOG_CHANNEL,
+                f"#PremiumExpired\n\n"
+                f"User ID: {user_id}\n"
+                f"Plan: {plan_name}\n"
+                f"Expired: {expire_str}"
+            )
+            return
+
+        if mp.get(kind):
+            return
+        # delivery (and retries) belong to the notifier from here on
+        notify(
+            user_id,
+            REMINDER_TEXT[kind].format(plan=mp.get('plan'), expire=expire_str),
+            parse_mode=enums.ParseMode.HTML
+        )
+        db.set_reminder_flag(user_id, kind)
+
+    async def run(self, bot):
+        while True:
+            try:
+                if not self.next_refresh or datetime.now() >= self.next_refresh:
+                    self.rebuild()
+
+                while self.changed:
+                    user_id = self.changed.pop()
+                    self.schedule(user_id, db.get_plan(user_id))
+
+                now = datetime.now()
+                while self.heap and self.heap[0][0] <= now:
+                    _, _, user_id, version, kind, expire = heapq.heappop(self.heap)
+                    if self.versions.get(user_id) == version:
+                        await self.fire(bot, user_id, kind, expire)
+
+                wake_at = self.next_refresh
+                if self.heap:
+                    wake_at = min(wake_at, self.heap[0][0])
+                timeout = max((wake_at - datetime.now()).total_seconds(), 0)
+
+                self.wakeup.clear()
+                if not self.changed:
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+
+            except Exception as e:
+                print(f"Error in check_premium_expired: {e}")
+                await asyncio.sleep(60)
+
+
+def migrate_string_expiry():
+    """Legacy plans stored expire as a string, store it as a datetime"""
+    for p in db.get_string_expiry_plans():
+        expire = parse_expire_time(p["status"]["expire"])
+        if expire:
+            db.set_plan_expire(p["id"], expire)
+
+
+premium_scheduler = PremiumScheduler()
+db.plan_listeners.append(premium_scheduler.plan_changed)
 
 
-# ─────────────────────────────────────────────
-# ⏰ PREMIUM EXPIRY CHECKER & REMINDER
-# ─────────────────────────────────────────────
 async def check_premium_expired(bot):
-    """
-    Background task that runs every 20 minutes to:
-    1. Check expired premium users
-    2. Send expiry reminders (24h, 6h, 1h before expiry)
-    """
-    while True:
-        try:
-            current_time = datetime.now()
-            
-            for p in db.get_premium_users():
-                user_id = p.get("id")
-                mp = p.get("status", {})
-                
-                if mp.get("premium") and mp.get("expire"):
-                    # ✅ Convert to datetime
-                    expire_time = parse_expire_time(mp["expire"])
-                    
-                    if not expire_time:
-                        continue
-                    
-                    time_left = expire_time - current_time
-                    
-                    # Check if expired
-                    if time_left.total_seconds() <= 0:
-                        try:
-                            await bot.send_message(
-                                user_id,
-                                f"❌ Your premium {mp.get('plan')} plan has expired.\n\n"
-                                f"Expired on: {expire_time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                                f"Use /plan to renew your subscription."
-                            )
-                        except Exception as e:
-                            print(f"Failed to notify user {user_id}: {e}")
-
-                        mp.update({
-                            "expire": "",
-                            "plan": "",
-                            "premium": False
-                        })
-                        db.update_plan(user_id, mp)
-                        
-                        # Log to admin channel
-                        try:
-                            await bot.send_message(
-                                LOG_CHANNEL,
-                                f"#PremiumExpired\n\n"
-                                f"User ID: {user_id}\n"
-                                f"Plan: {mp.get('plan', 'Unknown')}\n"
-                                f"Expired: {expire_time.strftime('%Y-%m-%d %H:%M:%S')}"
-                            )
-                        except:
-                            pass
-                    
-                    # Send reminders
-                    else:
-                        hours_left = time_left.total_seconds() / 3600
-                        
-                        # 24 hour reminder
-                        if 23.5 <= hours_left <= 24.5 and not mp.get("reminded_24h"):
-                            try:
-                                await bot.send_message(
-                                    user_id,
-                                    f"⏰ <b>Premium Expiry Reminder</b>\n\n"
-                                    f"Your premium {mp.get('plan')} plan will expire in 24 hours.\n"
-                                    f"Expiry time: {expire_time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                                    f"Use /plan to renew your subscription.",
-                                    parse_mode=enums.ParseMode.HTML
-                                )
-                                mp["reminded_24h"] = True
-                                db.update_plan(user_id, mp)
-                            except Exception as e:
-                                print(f"Failed to send 24h reminder to {user_id}: {e}")
-                        
-                        # 6 hour reminder
-                        elif 5.5 <= hours_left <= 6.5 and not mp.get("reminded_6h"):
-                            try:
-                                await bot.send_message(
-                                    user_id,
-                                    f"⚠️ <b>Premium Expiry Alert</b>\n\n"
-                                    f"Your premium {mp.get('plan')} plan will expire in 6 hours.\n"
-                                    f"Expiry time: {expire_time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                                    f"Use /plan to renew now!",
-                                    parse_mode=enums.ParseMode.HTML
-                                )
-                                mp["reminded_6h"] = True
-                                db.update_plan(user_id, mp)
-                            except Exception as e:
-                                print(f"Failed to send 6h reminder to {user_id}: {e}")
-                        
-                        # 1 hour reminder
-                        elif 0.5 <= hours_left <= 1.5 and not mp.get("reminded_1h"):
-                            try:
-                                await bot.send_message(
-                                    user_id,
-                                    f"🚨 <b>URGENT: Premium Expiring Soon</b>\n\n"
-                                    f"Your premium {mp.get('plan')} plan will expire in 1 hour!\n"
-                                    f"Expiry time: {expire_time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                                    f"Renew immediately to avoid service interruption: /plan",
-                                    parse_mode=enums.ParseMode.HTML
-                                )
-                                mp["reminded_1h"] = True
-                                db.update_plan(user_id, mp)
-                            except Exception as e:
-                                print(f"Failed to send 1h reminder to {user_id}: {e}")
-            
-            # Check every 20 minutes (1200 seconds)
-            await asyncio.sleep(1200)
-            
-        except Exception as e:
-            print(f"Error in check_premium_expired: {e}")
-            await asyncio.sleep(1200)
+    """Background task: expiry reminders (24h, 6h, 1h) and expiries"""
+    await premium_scheduler.run(bot)
 
 
 # ─────────────────────────────────────────────
@@ -396,7 +392,7 @@ async def remove_premium(bot: Client, message: Message):
         mp = db.get_plan(user.id)
         old_plan = mp.get('plan', 'Unknown')
         
-        mp['expire'] = ''
+        mp['expire'] = None
         mp['plan'] = ''
         mp['premium'] = False
         mp['reminded_24h'] = False
@@ -434,6 +430,50 @@ async def remove_premium(bot: Client, message: Message):
             pass
 
 
+PRM_LIST_PAGE = 20
+
+
+async def premium_list_page(bot, page):
+    """Text and nav buttons of one /prm_list page"""
+    total = db.get_premium_count()
+    pr = db.get_premium_page(page * PRM_LIST_PAGE, PRM_LIST_PAGE)
+    if not pr:
+        return None, None
+
+    try:
+        users = {u.id: u for u in await bot.get_users([p['id'] for p in pr])}
+    except:
+        users = {}
+
+    t = '<b>💎 Premium Users List</b>\n\n'
+    for idx, p in enumerate(pr, page * PRM_LIST_PAGE + 1):
+        mp = p.get('status', {})
+        plan = mp.get('plan', 'Unknown')
+        u = users.get(p['id'])
+        if u:
+            t += f"{idx}. {u.mention} (<code>{p['id']}</code>)\n"
+        else:
+            t += f"{idx}. User ID: <code>{p['id']}</code> (Not accessible)\n"
+
+        expire_dt = parse_expire_time(mp.get('expire'))
+        if expire_dt:
+            days_left = max(0, (expire_dt - datetime.now()).days)
+            t += f"   Plan: {plan} | Days left: {days_left}\n\n"
+        else:
+            t += f"   Plan: {plan}\n\n"
+
+    pages = (total + PRM_LIST_PAGE - 1) // PRM_LIST_PAGE
+    t += f"<b>Total Premium Users: {total}</b>"
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton('« Back', callback_data=f'prm_list#{page - 1}'))
+    nav.append(InlineKeyboardButton(f'{page + 1} / {max(pages, 1)}', callback_data='pages'))
+    if page + 1 < pages:
+        nav.append(InlineKeyboardButton('Next »', callback_data=f'prm_list#{page + 1}'))
+    return t, InlineKeyboardMarkup([nav])
+
+
 @Client.on_message(filters.command('prm_list') & filters.user(ADMINS))
 async def premium_list(bot: Client, message: Message):
     """Admin command to list all premium users"""
@@ -441,39 +481,19 @@ async def premium_list(bot: Client, message: Message):
         return await message.reply('Premium feature was disabled')
     
     tx = await message.reply('🔍 Getting list of premium users...')
-    pr = [i for i in db.get_premium_users() if i.get('status', {}).get('premium')]
-    
-    if not pr:
+    t, markup = await premium_list_page(bot, 0)
+    if not t:
         return await tx.edit_text('📭 No premium users found in database.')
-    
-    t = '<b>💎 Premium Users List</b>\n\n'
-    
-    for idx, p in enumerate(pr, 1):
-        try:
-            u = await bot.get_users(p['id'])
-            mp = p.get('status', {})
-            expire = mp.get('expire', '')
-            plan = mp.get('plan', 'Unknown')
-            
-            if expire:
-                # ✅ Convert to datetime
-                expire_dt = parse_expire_time(expire)
-                if expire_dt:
-                    time_left = expire_dt - datetime.now()
-                    days_left = max(0, time_left.days)
-                    t += f"{idx}. {u.mention} (<code>{p['id']}</code>)\n"
-                    t += f"   Plan: {plan} | Days left: {days_left}\n\n"
-                else:
-                    t += f"{idx}. {u.mention} (<code>{p['id']}</code>)\n"
-                    t += f"   Plan: {plan}\n\n"
-            else:
-                t += f"{idx}. {u.mention} (<code>{p['id']}</code>)\n"
-                t += f"   Plan: {plan}\n\n"
-        except:
-            t += f"{idx}. User ID: <code>{p['id']}</code> (Not accessible)\n\n"
-    
-    t += f"<b>Total Premium Users: {len(pr)}</b>"
-    await tx.edit_text(t, parse_mode=enums.ParseMode.HTML)
+    await tx.edit_text(t, reply_markup=markup, parse_mode=enums.ParseMode.HTML)
+
+
+@Client.on_callback_query(filters.regex(r'^prm_list#') & filters.user(ADMINS))
+async def premium_list_nav(bot: Client, query: CallbackQuery):
+    page = int(query.data.split('#')[1])
+    t, markup = await premium_list_page(bot, page)
+    if not t:
+        return await query.answer('No more users', show_alert=True)
+    await query.message.edit_text(t, reply_markup=markup, parse_mode=enums.ParseMode.HTML)
 
 
 @Client.on_message(filters.command('trial_on') & filters.user(ADMINS))
@@ -0,0 +1,16 @@
+import os
+
+# info.py reads its config at import time; an unreachable Mongo with a short
+# server selection timeout keeps the startup index creation from hanging.
+for key, value in {
+    "API_ID": "1",
+    "API_HASH": "x",
+    "BOT_TOKEN": "1:x",
+    "ADMINS": "1",
+    "LOG_CHANNEL": "-1",
+    "SUPPORT_GROUP": "-1",
+    "BIN_CHANNEL": "-1",
+    "URL": "http://localhost/",
+    "DATABASE_URL": "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100",
+}.items():
+    os.environ.setdefault(key, value)
@@ -0,0 +1,65 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import utils
+from utils import temp, is_premium_many
+
+
+@pytest.fixture
+def plans(monkeypatch):
+    """Fake Premiums collection: {user_id: status}, records each get_plans call"""
+    store = {}
+    calls = []
+
+    def get_plans(user_ids):
+        calls.append(list(user_ids))
+        return {uid: store[uid] for uid in user_ids if uid in store}
+
+    monkeypatch.setattr(utils, "IS_PREMIUM", True)
+    monkeypatch.setattr(utils.db, "get_plans", get_plans)
+    temp.PREMIUM.clear()
+    yield store, calls
+    temp.PREMIUM.clear()
+
+
+def test_one_query_for_all_misses(plans):
+    store, calls = plans
+    expire = datetime.now() + timedelta(days=1)
+    store[10] = {"premium": True, "expire": expire, "plan": "1d"}
+
+    result = asyncio.run(is_premium_many([10, 11, 12]))
+
+    assert result == {10: True, 11: False, 12: False}
+    assert calls == [[10, 11, 12]]
+    assert set(temp.PREMIUM) == {10, 11, 12}
+
+
+def test_cached_users_skip_the_query(plans):
+    store, calls = plans
+    utils._cache_premium(20, True, None)
+
+    result = asyncio.run(is_premium_many([20, 21]))
+
+    assert result == {20: True, 21: False}
+    assert calls == [[21]]
+
+
+def test_expired_entries_are_fetched_again(plans):
+    store, calls = plans
+    temp.PREMIUM[30] = (True, time.time() - 1)
+
+    assert asyncio.run(is_premium_many([30])) == {30: False}
+    assert calls == [[30]]
+
+
+def test_lapsed_plans_are_not_cached(plans):
+    store, calls = plans
+    expire = datetime.now() - timedelta(days=1)
+    store[40] = {"premium": True, "expire": expire, "plan": "1d"}
+
+    assert asyncio.run(is_premium_many([40])) == {40: False}
+    # left for is_premium to downgrade and notify
+    assert 40 not in temp.PREMIUM
@@ -1,13 +1,23 @@
 import asyncio
 import re
+import time
 import requests
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from hydrogram.errors import FloodWait
+from hydrogram.errors import (
+    FloodWait, UserIsBlocked, InputUserDeactivated, PeerIdInvalid, UserDeactivated
+)
 from hydrogram import enums
 from hydrogram.types import InlineKeyboardButton
 
-from info import ADMINS, IS_PREMIUM, TIME_ZONE, LOG_CHANNEL
+from info import (
+    ADMINS, IS_PREMIUM, TIME_ZONE, BIN_CHANNEL, CACHE_TIME,
+    NOTIFY_WORKERS, NOTIFY_RATE, SETTINGS_WATCH,
+    SEARCH_LIMIT_PM, SEARCH_BURST_PM, SEARCH_LIMIT_USER, SEARCH_BURST_USER,
+    SEARCH_LIMIT_CHAT, SEARCH_BURST_CHAT
+)
 from database.users_chats_db import db
+from database.ia_filterdb import recount_files
 
 
 # ─────────────────────────────────────────────
@@ -15,38 +25,441 @@ from database.users_chats_db import db
 # ─────────────────────────────────────────────
 class temp(object):
     START_TIME = 0
-    BANNED_USERS = []
-    BANNED_CHATS = []
+    BANNED_USERS = set()
+    BANNED_CHATS = set()
     ME = None
     CANCEL = False
     U_NAME = None
     B_NAME = None
-    SETTINGS = {}
-    FILES = {}
-    USERS_CANCEL = False
-    GROUPS_CANCEL = False
+    SETTINGS = OrderedDict()
     BOT = None
-    PREMIUM = {}
+    PREMIUM = OrderedDict()
     PM_FILES = {}
+    BIN_COPIES = {}
+    ADMINS = {}
 
 
 # ─────────────────────────────────────────────
 # 👮 ADMIN CHECK
 # ─────────────────────────────────────────────
+ADMIN_STATUSES = (
+    enums.ChatMemberStatus.ADMINISTRATOR,
+    enums.ChatMemberStatus.OWNER
+)
+ADMIN_CACHE_TIME = 600
+ADMIN_CACHE_SIZE = 5000
+
+
+async def get_chat_admins(bot, chat_id):
+    """
+    {user_id: User} of a chat's admins, cached for ADMIN_CACHE_TIME.
+    Dropped early by invalidate_admins on chat_member updates.
+    """
+    cached = temp.ADMINS.get(chat_id)
+    if cached and cached[1] > time.time():
+        return cached[0]
+
+    admins = {}
+    async for member in bot.get_chat_members(chat_id, filter=enums.ChatMembersFilter.ADMINISTRATORS):
+        admins[member.user.id] = member.user
+
+    if len(temp.ADMINS) >= ADMIN_CACHE_SIZE:
+        temp.ADMINS.pop(next(iter(temp.ADMINS)))
+    temp.ADMINS[chat_id] = (admins, time.time() + ADMIN_CACHE_TIME)
+    return admins
+
+
+def invalidate_admins(chat_id):
+    temp.ADMINS.pop(chat_id, None)
+
+
 async def is_check_admin(bot, chat_id, user_id):
+    try:
+        return user_id in await get_chat_admins(bot, chat_id)
+    except Exception:
+        pass
+    # admin list not available, ask for this member only
     try:
         member = await bot.get_chat_member(chat_id, user_id)
-        return member.status in (
-            enums.ChatMemberStatus.ADMINISTRATOR,
-            enums.ChatMemberStatus.OWNER
-        )
+        return member.status in ADMIN_STATUSES
     except Exception:
         return False
 
 
 # ─────────────────────────────────────────────
-# 💎 PREMIUM SYSTEM (Synced with Premium.py)
+# 📨 NOTIFICATION DISPATCHER
 # ─────────────────────────────────────────────
+class TokenBucket:
+    """`rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    def try_acquire(self, tokens=1):
+        now = self._refill()
+        if now < self.paused_until or self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+    async def acquire(self, tokens=1):
+        while True:
+            now = self._refill()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+            elif self.tokens >= tokens:
+                self.tokens -= tokens
+                return
+            else:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Hold every caller, e.g. after a FloodWait"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+# errors that will never succeed on retry
+PERMANENT_ERRORS = (UserIsBlocked, InputUserDeactivated, PeerIdInvalid, UserDeactivated)
+
+
+class Notifier:
+    """
+    Outbound message queue: NOTIFY_WORKERS senders sharing one token bucket.
+    FloodWait pauses the bucket and the message is retried; other failures
+    are retried a few times, then stored in Mongo and retried later.
+    """
+    MAX_TRIES = 3
+    MAX_DURABLE_TRIES = 5
+    DURABLE_RETRY = 600
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.bucket = TokenBucket(NOTIFY_RATE)
+        self.bot = None
+        self.tasks = []
+        self.stats = {"sent": 0, "failed": 0, "dropped": 0}
+
+    def notify(self, chat_id, text, parse_mode=None, durable_tries=0):
+        self.queue.put_nowait({
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": parse_mode.name if parse_mode else None,
+            "durable_tries": durable_tries
+        })
+
+    async def start(self, bot):
+        self.bot = bot
+        for _ in range(NOTIFY_WORKERS):
+            self.tasks.append(asyncio.create_task(self.worker()))
+        self.tasks.append(asyncio.create_task(self.retry_failed()))
+
+    async def send(self, job):
+        parse_mode = enums.ParseMode[job["parse_mode"]] if job["parse_mode"] else None
+        await self.bot.send_message(job["chat_id"], job["text"], parse_mode=parse_mode)
+
+    async def worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.deliver(job)
+            finally:
+                self.queue.task_done()
+
+    async def deliver(self, job):
+        tries = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                await self.send(job)
+                self.stats["sent"] += 1
+                return
+            except FloodWait as e:
+                self.bucket.pause(e.value)
+            except PERMANENT_ERRORS:
+                self.stats["dropped"] += 1
+                return
+            except Exception as e:
+                tries += 1
+                if tries >= self.MAX_TRIES:
+                    self.save_failed(job, e)
+                    return
+                await asyncio.sleep(2 ** tries)
+
+    def save_failed(self, job, error):
+        self.stats["failed"] += 1
+        if job["durable_tries"] >= self.MAX_DURABLE_TRIES:
+            print(f"Notification to {job['chat_id']} dropped: {error}")
+            return
+        try:
+            db.save_notification({
+                **job,
+                "durable_tries": job["durable_tries"] + 1,
+                "error": str(error),
+                "next_try": datetime.utcnow() + timedelta(seconds=self.DURABLE_RETRY)
+            })
+        except Exception as e:
+            print(f"Failed to store notification: {e}")
+
+    async def retry_failed(self):
+        while True:
+            try:
+                for doc in db.pop_due_notifications(datetime.utcnow()):
+                    self.queue.put_nowait({
+                        "chat_id": doc["chat_id"],
+                        "text": doc["text"],
+                        "parse_mode": doc.get("parse_mode"),
+                        "durable_tries": doc.get("durable_tries", 0)
+                    })
+            except Exception as e:
+                print(f"Error in retry_failed: {e}")
+            await asyncio.sleep(self.DURABLE_RETRY)
+
+
+notifier = Notifier()
+notify = notifier.notify
+
+
+# ─────────────────────────────────────────────
+# 🚦 SEARCH RATE LIMITS
+# ─────────────────────────────────────────────
+class RateLimiter:
+    """One TokenBucket per key (user or chat id), least recently used keys dropped"""
+
+    def __init__(self, per_minute, burst, size=20000):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.size = size
+        self.buckets = OrderedDict()
+        self.noticed = set()
+        self.throttled = 0
+
+    def _bucket(self, key):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self.buckets) > self.size:
+                old, _ = self.buckets.popitem(last=False)
+                self.noticed.discard(old)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def allow(self, key):
+        if self._bucket(key).try_acquire():
+            self.noticed.discard(key)
+            return True
+        self.throttled += 1
+        return False
+
+    def first_block(self, key):
+        """True once per throttled stretch, so the cooldown notice isn't spammed"""
+        if key in self.noticed:
+            return False
+        self.noticed.add(key)
+        return True
+
+    def wait_time(self, key):
+        bucket = self._bucket(key)
+        return max(0, (1 - bucket.tokens) / bucket.rate)
+
+
+SEARCH_LIMITS = {
+    "pm": RateLimiter(SEARCH_LIMIT_PM, SEARCH_BURST_PM),
+    "user": RateLimiter(SEARCH_LIMIT_USER, SEARCH_BURST_USER),
+    "chat": RateLimiter(SEARCH_LIMIT_CHAT, SEARCH_BURST_CHAT)
+}
+
+
+def search_throttle(user_id, chat_id=None):
+    """
+    None if the search may run, otherwise (limiter, key) that blocked it.
+    PM searches use the premium tier, group searches the per-user
+    and per-chat buckets. Bot admins are never limited.
+    """
+    if user_id in ADMINS:
+        return None
+    if chat_id is None:
+        checks = (("pm", user_id),)
+    else:
+        checks = (("user", user_id), ("chat", chat_id))
+    for tier, key in checks:
+        limiter = SEARCH_LIMITS[tier]
+        if not limiter.allow(key):
+            return limiter, key
+    return None
+
+
+# ─────────────────────────────────────────────
+# 🗑️ SCHEDULED DELETIONS
+# ─────────────────────────────────────────────
+class DeletionScheduler:
+    """
+    Delayed message deletion that survives restarts.
+
+    Deletions of MIN_DURABLE seconds or more are stored in Mongo and
+    loaded LOAD_AHEAD seconds before they are due; shorter ones only live
+    in memory. Pending deletions sit in a timer wheel of one second slots,
+    and each tick deletes everything due with one delete_messages call
+    per chat (100 ids max per call).
+    """
+    MIN_DURABLE = 60
+    LOAD_AHEAD = 600
+    BATCH = 100
+
+    def __init__(self):
+        self.wheel = {}  # slot (epoch second) -> [(chat_id, message_ids, doc_id)]
+        self.loaded_until = 0
+        self.bot = None
+
+    def add(self, due, chat_id, message_ids, doc_id=None):
+        self.wheel.setdefault(int(due), []).append((chat_id, message_ids, doc_id))
+
+    def schedule(self, chat_id, message_ids, delay):
+        if isinstance(message_ids, int):
+            message_ids = [message_ids]
+        due = time.time() + delay
+        if delay < self.MIN_DURABLE:
+            self.add(due, chat_id, message_ids)
+            return
+        try:
+            doc_id = db.add_deletion(chat_id, message_ids, due)
+        except Exception as e:
+            print(f"Failed to store deletion: {e}")
+            self.add(due, chat_id, message_ids)
+            return
+        if due < self.loaded_until:
+            # the loader already passed this window
+            self.add(due, chat_id, message_ids, doc_id)
+
+    def load(self):
+        """Pull stored deletions of the next LOAD_AHEAD seconds into the wheel"""
+        until = time.time() + self.LOAD_AHEAD
+        for doc in db.get_deletions(self.loaded_until, until):
+            self.add(doc["due"], doc["chat_id"], doc["message_ids"], doc["_id"])
+        self.loaded_until = until
+
+    async def start(self, bot):
+        self.bot = bot
+        asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            try:
+                if time.time() + self.LOAD_AHEAD / 2 >= self.loaded_until:
+                    self.load()
+
+                now = int(time.time())
+                due = [slot for slot in self.wheel if slot <= now]
+                if due:
+                    await self.flush([job for slot in due for job in self.wheel.pop(slot)])
+            except Exception as e:
+                print(f"Error in deletion scheduler: {e}")
+            await asyncio.sleep(1)
+
+    async def flush(self, jobs):
+        by_chat = {}
+        doc_ids = []
+        for chat_id, message_ids, doc_id in jobs:
+            by_chat.setdefault(chat_id, []).extend(message_ids)
+            if doc_id is not None:
+                doc_ids.append(doc_id)
+
+        for chat_id, message_ids in by_chat.items():
+            for i in range(0, len(message_ids), self.BATCH):
+                batch = message_ids[i:i + self.BATCH]
+                try:
+                    await self.bot.delete_messages(chat_id, batch)
+                except FloodWait as e:
+                    self.add(time.time() + e.value, chat_id, batch)
+                except Exception:
+                    # already deleted / no rights
+                    pass
+
+        if doc_ids:
+            db.remove_deletions(doc_ids)
+
+
+deleter = DeletionScheduler()
+
+
+def schedule_delete(chat_id, message_ids, delay):
+    """Delete message(s) of a chat after `delay` seconds"""
+    deleter.schedule(chat_id, message_ids, delay)
+
+
+# ─────────────────────────────────────────────
+# 💎 PREMIUM SYSTEM (single source, used by Premium.py too)
+# ─────────────────────────────────────────────
+PREMIUM_CACHE_SIZE = 100000
+PREMIUM_STATS = {"hits": 0, "misses": 0}
+
+
+def parse_expire_time(expire):
+    """
+    Convert expire field to datetime object
+    Handles both string and datetime formats
+    """
+    if not expire:
+        return None
+
+    if isinstance(expire, datetime):
+        return expire
+
+    if isinstance(expire, str):
+        try:
+            from dateutil import parser
+            return parser.parse(expire)
+        except:
+            return None
+
+    return None
+
+
+def invalidate_premium(user_id):
+    temp.PREMIUM.pop(int(user_id), None)
+
+
+db.plan_listeners.append(invalidate_premium)
+
+
+def _cache_premium(user_id, active, expire_dt):
+    """Entry stays valid until min(expire, now + CACHE_TIME)"""
+    now = time.time()
+    valid_until = now + CACHE_TIME
+    if active and expire_dt:
+        valid_until = min(valid_until, expire_dt.timestamp())
+
+    # LRU: drop the least recently used entry, never the whole cache
+    temp.PREMIUM[user_id] = (active, valid_until)
+    temp.PREMIUM.move_to_end(user_id)
+    if len(temp.PREMIUM) > PREMIUM_CACHE_SIZE:
+        temp.PREMIUM.popitem(last=False)
+
+
+def _plan_active(mp):
+    """(active, expire datetime) of a plan without side effects"""
+    if not mp.get("premium"):
+        return False, None
+    expire = mp.get("expire")
+    expire_dt = parse_expire_time(expire)
+    if expire and not expire_dt:
+        # unparsable expire counts as expired
+        return False, None
+    if expire_dt and expire_dt < datetime.now():
+        return False, expire_dt
+    return True, expire_dt
+
+
 async def is_premium(user_id, bot):
     """Check if user has active premium subscription"""
     if not IS_PREMIUM:
@@ -54,159 +467,73 @@ async def is_premium(user_id, bot):
     if user_id in ADMINS:
         return True
 
+    cached = temp.PREMIUM.get(user_id)
+    if cached and cached[1] > time.time():
+        PREMIUM_STATS["hits"] += 1
+        temp.PREMIUM.move_to_end(user_id)
+        return cached[0]
+    PREMIUM_STATS["misses"] += 1
+
     mp = db.get_plan(user_id)
-    if mp.get("premium"):
-        expire = mp.get("expire")
-        
-        # ✅ Handle expire field (can be string, datetime, or empty)
-        if expire:
-            # Convert string to datetime if needed
-            if isinstance(expire, str):
-                try:
-                    from dateutil import parser
-                    expire = parser.parse(expire)
-                except:
-                    # If parsing fails, assume expired
-                    mp.update({
-                        "expire": "",
-                        "plan": "",
-                        "premium": False
-                    })
-                    db.update_plan(user_id, mp)
-                    return False
-            
-            # Check if expired
-            if expire < datetime.now():
-                try:
-                    await bot.send_message(
-                        user_id,
-                        f"❌ Your premium {mp.get('plan')} plan has expired.\n\nUse /plan to renew your subscription."
-                    )
-                except Exception:
-                    pass
+    active, expire_dt = _plan_active(mp)
 
-                mp.update({
-                    "expire": "",
-                    "plan": "",
-                    "premium": False
-                })
-                db.update_plan(user_id, mp)
-                return False
-        
-        return True
-    return False
+    if mp.get("premium") and not active:
+        if expire_dt:
+            notify(
+                user_id,
+                f"❌ Your premium {mp.get('plan')} plan has expired.\n\nUse /plan to renew your subscription."
+            )
+
+        mp.update({
+            "expire": None,
+            "plan": "",
+            "premium": False
+        })
+        db.update_plan(user_id, mp)
 
+    _cache_premium(user_id, active, expire_dt)
+    return active
 
-async def check_premium(bot):
+
+async def is_premium_many(user_ids):
     """
-    Background task that runs every 20 minutes to:
-    1. Check expired premium users
-    2. Send expiry reminders (24h, 6h, 1h before expiry)
-    
-    ⚠️ NOTE: This function is now replaced by check_premium_expired() in Premium.py
-    This is kept for backward compatibility only.
+    Batch premium lookup: {user_id: bool}
+    Served from cache where possible, one DB query for the rest.
+    Does not notify or downgrade expired users (is_premium does that).
     """
-    while True:
-        try:
-            current_time = datetime.now()
-            
-            for p in db.get_premium_users():
-                user_id = p.get("id")
-                mp = p.get("status", {})
-                
-                if mp.get("premium") and mp.get("expire"):
-                    expire_time = mp["expire"]
-                    time_left = expire_time - current_time
-                    
-                    # Check if expired
-                    if time_left.total_seconds() <= 0:
-                        try:
-                            await bot.send_message(
-                                user_id,
-                                f"❌ Your premium {mp.get('plan')} plan has expired.\n\n"
-                                f"Expired on: {expire_time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                                f"Use /plan to renew your subscription."
-                            )
-                        except Exception as e:
-                            print(f"Failed to notify user {user_id}: {e}")
-
-                        mp.update({
-                            "expire": "",
-                            "plan": "",
-                            "premium": False
-                        })
-                        db.update_plan(user_id, mp)
-                        
-                        # Log to admin channel
-                        try:
-                            await bot.send_message(
-                                LOG_CHANNEL,
-                                f"#PremiumExpired\n\n"
-                                f"User ID: {user_id}\n"
-                                f"Plan: {mp.get('plan', 'Unknown')}\n"
-                                f"Expired: {expire_time.strftime('%Y-%m-%d %H:%M:%S')}"
-                            )
-                        except:
-                            pass
-                    
-                    # Send reminders
-                    else:
-                        hours_left = time_left.total_seconds() / 3600
-                        
-                        # 24 hour reminder
-                        if 23.5 <= hours_left <= 24.5 and not mp.get("reminded_24h"):
-                            try:
-                                await bot.send_message(
-                                    user_id,
-                                    f"⏰ <b>Premium Expiry Reminder</b>\n\n"
-                                    f"Your premium {mp.get('plan')} plan will expire in 24 hours.\n"
-                                    f"Expiry time: {expire_time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                                    f"Use /plan to renew your subscription.",
-                                    parse_mode=enums.ParseMode.HTML
-                                )
-                                mp["reminded_24h"] = True
-                                db.update_plan(user_id, mp)
-                            except Exception as e:
-                                print(f"Failed to send 24h reminder to {user_id}: {e}")
-                        
-                        # 6 hour reminder
-                        elif 5.5 <= hours_left <= 6.5 and not mp.get("reminded_6h"):
-                            try:
-                                await bot.send_message(
-                                    user_id,
-                                    f"⚠️ <b>Premium Expiry Alert</b>\n\n"
-                                    f"Your premium {mp.get('plan')} plan will expire in 6 hours.\n"
-                                    f"Expiry time: {expire_time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                                    f"Use /plan to renew now!",
-                                    parse_mode=enums.ParseMode.HTML
-                                )
-                                mp["reminded_6h"] = True
-                                db.update_plan(user_id, mp)
-                            except Exception as e:
-                                print(f"Failed to send 6h reminder to {user_id}: {e}")
-                        
-                        # 1 hour reminder
-                        elif 0.5 <= hours_left <= 1.5 and not mp.get("reminded_1h"):
-                            try:
-                                await bot.send_message(
-                                    user_id,
-                                    f"🚨 <b>URGENT: Premium Expiring Soon</b>\n\n"
-                                    f"Your premium {mp.get('plan')} plan will expire in 1 hour!\n"
-                                    f"Expiry time: {expire_time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                                    f"Renew immediately to avoid service interruption: /plan",
-                                    parse_mode=enums.ParseMode.HTML
-                                )
-                                mp["reminded_1h"] = True
-                                db.update_plan(user_id, mp)
-                            except Exception as e:
-                                print(f"Failed to send 1h reminder to {user_id}: {e}")
-            
-            # Check every 20 minutes (1200 seconds)
-            await asyncio.sleep(1200)
-            
-        except Exception as e:
-            print(f"Error in check_premium: {e}")
-            await asyncio.sleep(1200)
+    result = {}
+    missing = []
+    now = time.time()
+
+    for user_id in user_ids:
+        if not IS_PREMIUM or user_id in ADMINS:
+            result[user_id] = True
+            continue
+        cached = temp.PREMIUM.get(user_id)
+        if cached and cached[1] > now:
+            PREMIUM_STATS["hits"] += 1
+            temp.PREMIUM.move_to_end(user_id)
+            result[user_id] = cached[0]
+        else:
+            missing.append(user_id)
+
+    if missing:
+        PREMIUM_STATS["misses"] += len(missing)
+        plans = db.get_plans(missing)
+        for user_id in missing:
+            mp = plans.get(user_id, {})
+            active, expire_dt = _plan_active(mp)
+            # lapsed plans are left for is_premium to downgrade and notify
+            if active or not mp.get("premium"):
+                _cache_premium(user_id, active, expire_dt)
+            result[user_id] = active
+
+    return result
+
+
+def premium_cache_ratio():
+    total = PREMIUM_STATS["hits"] + PREMIUM_STATS["misses"]
+    return (PREMIUM_STATS["hits"] / total * 100) if total else 0.0
 
 
 def get_premium_button():
@@ -232,55 +559,151 @@ def premium_required(func):
 
 
 # ─────────────────────────────────────────────
-# 📢 BROADCAST
+# 📊 STATS COUNTERS
 # ─────────────────────────────────────────────
-async def broadcast_messages(user_id, message, pin=False):
-    try:
-        msg = await message.copy(chat_id=user_id)
-        if pin:
-            await msg.pin(both_sides=True)
-        return "Success"
-    except FloodWait as e:
-        await asyncio.sleep(e.value)
-        return await broadcast_messages(user_id, message, pin)
-    except Exception:
-        await db.delete_user(int(user_id))
-        return "Error"
+STATS_RECONCILE = 6 * 3600
 
 
-async def groups_broadcast_messages(chat_id, message, pin=False):
-    try:
-        msg = await message.copy(chat_id=chat_id)
-        if pin:
-            try:
-                await msg.pin()
-            except Exception:
-                pass
-        return "Success"
-    except FloodWait as e:
-        await asyncio.sleep(e.value)
-        return await groups_broadcast_messages(chat_id, message, pin)
-    except Exception:
-        await db.delete_chat(chat_id)
-        return "Error"
+async def reconcile_counters():
+    """
+    Recount users, chats, premium and files in a thread and overwrite the
+    counters document, repairing any drift of the incremental updates.
+    Runs at startup (fills the document on first deploy), then periodically.
+    """
+    while True:
+        try:
+            counts = await asyncio.to_thread(lambda: {**db.recount(), **recount_files()})
+            db.set_counters(counts)
+        except Exception as e:
+            print(f"Counter reconcile failed: {e}")
+        await asyncio.sleep(STATS_RECONCILE)
 
 
 # ─────────────────────────────────────────────
 # ⚙️ GROUP SETTINGS (CACHE)
+# LRU of {group_id: (settings, expires)}, entries live CACHE_TIME.
+# Readers get a copy, so nobody can mutate the cached dict.
 # ─────────────────────────────────────────────
+SETTINGS_CACHE_SIZE = 10000
+
+
 async def get_settings(group_id):
-    settings = temp.SETTINGS.get(group_id)
-    if not settings:
-        settings = await db.get_settings(group_id)
-        temp.SETTINGS[group_id] = settings
-    return settings
+    cached = temp.SETTINGS.get(group_id)
+    if cached and cached[1] > time.time():
+        temp.SETTINGS.move_to_end(group_id)
+        return dict(cached[0])
+
+    settings = await db.get_settings(group_id)
+    cache_settings(group_id, settings)
+    return dict(settings)
+
+
+def cache_settings(group_id, settings):
+    temp.SETTINGS[group_id] = (settings, time.time() + CACHE_TIME)
+    temp.SETTINGS.move_to_end(group_id)
+    if len(temp.SETTINGS) > SETTINGS_CACHE_SIZE:
+        temp.SETTINGS.popitem(last=False)
+
+
+def invalidate_settings(group_id=None):
+    if group_id is None:
+        temp.SETTINGS.clear()
+    else:
+        temp.SETTINGS.pop(group_id, None)
 
 
 async def save_group_settings(group_id, key, value):
-    current = await get_settings(group_id)
-    current[key] = value
-    temp.SETTINGS[group_id] = current
-    await db.update_settings(group_id, current)
+    """Write-through: Mongo first, then the cached copy"""
+    await db.update_setting(group_id, key, value)
+    cached = temp.SETTINGS.get(group_id)
+    if cached:
+        cache_settings(group_id, {**cached[0], key: value})
+
+
+WATCH_AWAIT_MS = 1000
+
+
+async def watch_settings():
+    """
+    Invalidate cached settings when another process writes them.
+    The change stream is polled with try_next, each poll blocks a worker
+    thread for at most WATCH_AWAIT_MS, so cancelling the task stops the
+    stream and closes it. Off unless SETTINGS_WATCH.
+    """
+    if not SETTINGS_WATCH:
+        return
+
+    while True:
+        stream = None
+        try:
+            stream = await asyncio.to_thread(db.watch_groups, WATCH_AWAIT_MS)
+            while True:
+                change = await asyncio.to_thread(stream.try_next)
+                if change is None:
+                    await asyncio.sleep(1)
+                    continue
+                # deletes carry only _id, drop everything
+                invalidate_settings((change.get("fullDocument") or {}).get("id"))
+        except Exception as e:
+            print(f"Settings change stream failed: {e}")
+        finally:
+            if stream:
+                stream.close()
+        await asyncio.sleep(30)
+
+
+# ─────────────────────────────────────────────
+# 🎥 BIN CHANNEL COPIES (STREAM LINKS)
+# ─────────────────────────────────────────────
+BIN_CACHE_SIZE = 50000
+BIN_CHECK_TIME = 3600  # re-check a cached copy still exists after this
+
+# copies in progress: {file_id: task}, shared by concurrent callers
+BIN_PENDING = {}
+
+
+async def _bin_message_exists(client, msg_id):
+    try:
+        msg = await client.get_messages(BIN_CHANNEL, msg_id)
+    except Exception:
+        return True  # can't tell, keep the stored copy
+    return bool(msg and not msg.empty and msg.media)
+
+
+async def _copy_to_bin(client, file_id):
+    msg_id = db.get_bin_copy(file_id)
+    if msg_id and await _bin_message_exists(client, msg_id):
+        return msg_id
+
+    # never copied, or the copy was deleted from BIN_CHANNEL
+    msg = await client.send_cached_media(chat_id=BIN_CHANNEL, file_id=file_id)
+    db.save_bin_copy(file_id, msg.id)
+    return msg.id
+
+
+async def get_bin_msg_id(client, file_id):
+    """
+    BIN_CHANNEL message id for a file.
+    The file is copied once; concurrent requests wait for the same copy
+    and a copy deleted from the channel is made again.
+    """
+    cached = temp.BIN_COPIES.get(file_id)
+    if cached and time.time() - cached[1] < BIN_CHECK_TIME:
+        return cached[0]
+
+    task = BIN_PENDING.get(file_id)
+    if not task:
+        task = asyncio.ensure_future(_copy_to_bin(client, file_id))
+        BIN_PENDING[file_id] = task
+        task.add_done_callback(lambda _: BIN_PENDING.pop(file_id, None))
+    # shielded: one cancelled caller must not cancel the copy for the others
+    msg_id = await asyncio.shield(task)
+
+    temp.BIN_COPIES.pop(file_id, None)
+    if len(temp.BIN_COPIES) >= BIN_CACHE_SIZE:
+        temp.BIN_COPIES.pop(next(iter(temp.BIN_COPIES)))
+    temp.BIN_COPIES[file_id] = (msg_id, time.time())
+    return msg_id
 
 
 # ─────────────────────────────────────────────
@@ -2,7 +2,9 @@
 
 from aiohttp import web
 from web.stream_routes import routes
+from web.utils.static_files import static_handler
 
 
 web_app = web.Application()
 web_app.add_routes(routes)
+web_app.router.add_get("/static/{name}", static_handler)
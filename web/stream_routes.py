@@ -1,11 +1,16 @@
 import math
 import secrets
 import mimetypes
-from info import BIN_CHANNEL
-from utils import temp
+from datetime import datetime, timezone
+from email.utils import format_datetime
 from aiohttp import web
+from hydrogram.errors import FloodWait
 from web.utils.custom_dl import TGCustomYield, chunk_size, offset_fix
+from web.utils.clients import get_media_message, mark_flood, work_loads
+from web.utils.governor import governor, client_ip
+from info import STREAM_RETRY_AFTER
 from web.utils.render_template import media_watch
+from web.utils.static_files import IMMUTABLE
 
 routes = web.RouteTableDef()
 
@@ -18,22 +23,63 @@ async def root_route_handler(request):
 async def watch_handler(request):
     try:
         message_id = int(request.match_info['message_id'])
-        return web.Response(text=await media_watch(message_id), content_type='text/html')
+        page = await media_watch(message_id)
+        headers = cache_headers(page.etag, page.last_modified, "public, max-age=3600")
+        if not_modified(request, page.etag, page.last_modified):
+            return web.Response(status=304, headers=headers)
+        return web.Response(text=page.html, content_type='text/html', headers=headers)
     except Exception as e:
         return web.Response(text="<h1>Something went wrong</h1>", content_type='text/html')
 
 @routes.get("/download/{message_id}")
 async def download_handler(request):
+    ip = client_ip(request)
+    if not governor.acquire(ip):
+        return busy_response(STREAM_RETRY_AFTER)
     try:
         message_id = int(request.match_info['message_id'])
         return await media_download(request, message_id)
+    except FloodWait as e:
+        # every streaming client is flooded
+        return busy_response(e.value)
     except:
         return web.Response(text="<h1>Something went wrong</h1>", content_type='text/html')
-        
+    finally:
+        governor.release(ip)
+
+
+def cache_headers(etag, last_modified, cache_control):
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified:
+        ts = datetime.fromtimestamp(last_modified.timestamp(), timezone.utc)
+        headers["Last-Modified"] = format_datetime(ts, usegmt=True)
+    return headers
+
+
+def not_modified(request, etag, last_modified):
+    """Conditional GET check (If-None-Match wins over If-Modified-Since)"""
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    since = request.if_modified_since
+    if since and last_modified:
+        return int(last_modified.timestamp()) <= int(since.timestamp())
+    return False
+
+
+def busy_response(retry_after):
+    return web.Response(
+        status=503,
+        text="<h1>Server is busy, please retry in a moment</h1>",
+        content_type='text/html',
+        headers={"Retry-After": str(retry_after)}
+    )
+
 
 async def media_download(request, message_id: int):
     range_header = request.headers.get('Range', 0)
-    media_msg = await temp.BOT.get_messages(BIN_CHANNEL, message_id)
+    index, client, media_msg = await get_media_message(message_id)
     media = getattr(media_msg, media_msg.media.value, None)
     file_size = media.file_size
 
@@ -45,33 +91,57 @@ async def media_download(request, message_id: int):
         from_bytes = request.http_range.start or 0
         until_bytes = request.http_range.stop or file_size - 1
 
-    req_length = until_bytes - from_bytes
+    req_length = until_bytes - from_bytes + 1
 
     new_chunk_size = await chunk_size(req_length)
     offset = await offset_fix(from_bytes, new_chunk_size)
     first_part_cut = from_bytes - offset
     last_part_cut = (until_bytes % new_chunk_size) + 1
-    part_count = math.ceil(req_length / new_chunk_size)
-    body = TGCustomYield().yield_file(media_msg, offset, first_part_cut, last_part_cut, part_count,
-                                      new_chunk_size)
+    # parts covering [offset, until_bytes], not just the requested length
+    part_count = math.ceil((until_bytes + 1 - offset) / new_chunk_size)
 
     file_name = media.file_name if media.file_name \
         else f"{secrets.token_hex(2)}.jpeg"
     mime_type = media.mime_type if media.mime_type \
         else f"{mimetypes.guess_type(file_name)}"
 
-    return_resp = web.Response(
+    # BIN_CHANNEL copies are immutable, let browsers and CDNs keep them
+    etag = f'"{media.file_unique_id}"'
+    headers = cache_headers(etag, media_msg.date, IMMUTABLE)
+    if not_modified(request, etag, media_msg.date):
+        return web.Response(status=304, headers=headers)
+
+    resp = web.StreamResponse(
         status=206 if range_header else 200,
-        body=body,
         headers={
+            **headers,
             "Content-Type": mime_type,
             "Content-Range": f"bytes {from_bytes}-{until_bytes}/{file_size}",
             "Content-Disposition": f'attachment; filename="{file_name}"',
             "Accept-Ranges": "bytes",
         }
     )
+    resp.content_length = req_length
+    await resp.prepare(request)
 
-    if return_resp.status == 200:
-        return_resp.headers.add("Content-Length", str(file_size))
+    if request.method == "HEAD":
+        return resp
+
+    # written here instead of handing aiohttp a generator so the
+    # counters are always released, even if the body is never read
+    work_loads[index] += 1
+    try:
+        body = TGCustomYield(client).yield_file(media_msg, offset, first_part_cut, last_part_cut, part_count,
+                                                new_chunk_size)
+        async for chunk in body:
+            await resp.write(chunk)
+    except FloodWait as e:
+        # the player retries the range and lands on another client
+        mark_flood(index, e.value)
+    except Exception:
+        # headers are already sent, just end the stream
+        pass
+    finally:
+        work_loads[index] -= 1
 
-    return return_resp
+    return resp
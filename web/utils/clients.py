@@ -0,0 +1,112 @@
+import time
+import asyncio
+import logging
+from hydrogram import Client
+from hydrogram.errors import FloodWait
+from info import API_ID, API_HASH, BIN_CHANNEL, MULTI_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# index -> Client (0 is always the main bot)
+multi_clients = {}
+# index -> number of streams currently served by that client
+work_loads = {}
+# index -> monotonic time until which the client is in FloodWait
+flood_until = {}
+
+
+async def start_client(index, token):
+    """Start one extra streaming client, returns None if it is unusable"""
+    client = Client(
+        name=f"stream_{index}",
+        api_id=API_ID,
+        api_hash=API_HASH,
+        bot_token=token,
+        in_memory=True,
+        no_updates=True
+    )
+    try:
+        await client.start()
+        # every client must be able to read the BIN_CHANNEL copies
+        await client.get_chat(BIN_CHANNEL)
+    except Exception as e:
+        logger.error(f"Stream client {index} failed to start: {e}")
+        try:
+            await client.stop()
+        except Exception:
+            pass
+        return None
+    return client
+
+
+async def initialize_clients(main_bot):
+    multi_clients[0] = main_bot
+    work_loads[0] = 0
+
+    if not MULTI_TOKENS:
+        return
+
+    clients = await asyncio.gather(
+        *(start_client(i, token) for i, token in enumerate(MULTI_TOKENS, 1))
+    )
+    for index, client in enumerate(clients, 1):
+        if client:
+            multi_clients[index] = client
+            work_loads[index] = 0
+
+    logger.info(f"Streaming with {len(multi_clients)} client(s)")
+
+
+async def stop_clients():
+    for index, client in list(multi_clients.items()):
+        if index == 0:
+            continue
+        try:
+            await client.stop()
+        except Exception:
+            pass
+
+
+def pick_client(exclude=()):
+    """Least loaded client that is not in FloodWait"""
+    now = time.monotonic()
+    indexes = [i for i in multi_clients if i not in exclude]
+    if not indexes:
+        return None
+
+    ready = [i for i in indexes if flood_until.get(i, 0) <= now]
+    if not ready:
+        # everyone is flooded, use the one that recovers first
+        return min(indexes, key=lambda i: flood_until.get(i, 0))
+    return min(ready, key=lambda i: work_loads[i])
+
+
+def mark_flood(index, seconds):
+    flood_until[index] = time.monotonic() + seconds
+    logger.warning(f"Stream client {index} hit FloodWait of {seconds}s")
+
+
+async def get_media_message(message_id):
+    """
+    Fetch a BIN_CHANNEL message through the least loaded client,
+    failing over to the next one on FloodWait.
+
+    Returns:
+        (client index, client, message)
+    """
+    tried = set()
+    error = None
+    while True:
+        index = pick_client(tried)
+        if index is None:
+            # every client is in FloodWait, surface the last one
+            if error:
+                raise error
+            raise RuntimeError("No stream clients available")
+        client = multi_clients[index]
+        try:
+            return index, client, await client.get_messages(BIN_CHANNEL, message_id)
+        except FloodWait as e:
+            mark_flood(index, e.value)
+            tried.add(index)
+            error = e
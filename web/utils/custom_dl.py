@@ -1,4 +1,6 @@
 import math
+import asyncio
+from collections import deque
 from typing import Union
 from hydrogram.types import Message
 from utils import temp
@@ -6,6 +8,8 @@ from hydrogram import Client, utils, raw
 from hydrogram.session import Session, Auth
 from hydrogram.errors import AuthBytesInvalid
 from hydrogram.file_id import FileId, FileType, ThumbnailSource
+from web.utils.governor import get_scheduler
+from info import STREAM_PREFETCH
 
 
 async def chunk_size(length):
@@ -18,14 +22,16 @@ async def offset_fix(offset, chunksize):
 
 
 class TGCustomYield:
-    def __init__(self):
+    def __init__(self, client: Client = None):
         """ A custom method to stream files from telegram.
         functions:
             generate_file_properties: returns the properties for a media on a specific message contained in FileId class.
             generate_media_session: returns the media session for the DC that contains the media file on the message.
             yield_file: yield a file from telegram servers for streaming.
+
+        client: the bot client the media message was fetched with (defaults to the main bot).
         """
-        self.main_bot = temp.BOT
+        self.main_bot = client or temp.BOT
 
     @staticmethod
     async def generate_file_properties(msg: Message):
@@ -122,85 +128,66 @@ class TGCustomYield:
 
         return location
 
-    async def yield_file(self, media_msg: Message, offset: int, first_part_cut: int,
-                         last_part_cut: int, part_count: int, chunk_size: int):
-        client = self.main_bot
-        data = await self.generate_file_properties(media_msg)
-        media_session = await self.generate_media_session(client, media_msg)
-
-        current_part = 1
-
-        location = await self.get_location(data)
-
-        r = await media_session.send(
-            raw.functions.upload.GetFile(
-                location=location,
-                offset=offset,
-                limit=chunk_size
-            ),
-        )
-
-        if isinstance(r, raw.types.upload.File):
-            while current_part <= part_count:
-                chunk = r.bytes
-                if not chunk:
-                    break
-                offset += chunk_size
-                if part_count == 1:
-                    yield chunk[first_part_cut:last_part_cut]
-                    break
-                if current_part == 1:
-                    yield chunk[first_part_cut:]
-                if 1 < current_part <= part_count:
-                    yield chunk
-
-                r = await media_session.send(
-                    raw.functions.upload.GetFile(
-                        location=location,
-                        offset=offset,
-                        limit=chunk_size
-                    ),
-                )
-
-                current_part += 1
+    async def get_file(self, media_session: Session, location, offset: int, limit: int):
+        """GetFile through the client's fair scheduler (one queue per stream)"""
+        scheduler = get_scheduler(self.main_bot)
+        await scheduler.acquire(id(self))
+        try:
+            return await media_session.send(
+                raw.functions.upload.GetFile(
+                    location=location,
+                    offset=offset,
+                    limit=limit
+                ),
+            )
+        finally:
+            scheduler.release()
 
-    async def download_as_bytesio(self, media_msg: Message):
+    async def iter_chunks(self, media_msg: Message, offset: int, chunk_size: int,
+                          part_count: int = None, prefetch: int = STREAM_PREFETCH):
+        """
+        Raw file chunks starting at offset.
+        Keeps `prefetch` GetFile requests in flight ahead of the consumer,
+        so at most (prefetch + 1) chunks are ever held in memory.
+        """
         client = self.main_bot
         data = await self.generate_file_properties(media_msg)
         media_session = await self.generate_media_session(client, media_msg)
-
         location = await self.get_location(data)
 
-        limit = 1024 * 1024
-        offset = 0
-
-        r = await media_session.send(
-            raw.functions.upload.GetFile(
-                location=location,
-                offset=offset,
-                limit=limit
-            )
-        )
-
-        if isinstance(r, raw.types.upload.File):
-            m_file = []
-            # m_file.name = file_name
+        pending = deque()
+        requested = 0
+        try:
             while True:
-                chunk = r.bytes
-
-                if not chunk:
+                while len(pending) <= prefetch and (part_count is None or requested < part_count):
+                    pending.append(asyncio.ensure_future(
+                        self.get_file(media_session, location, offset + requested * chunk_size, chunk_size)
+                    ))
+                    requested += 1
+                if not pending:
                     break
 
-                m_file.append(chunk)
-
-                offset += limit
-
-                r = await media_session.send(
-                    raw.functions.upload.GetFile(
-                        location=location,
-                        offset=offset,
-                        limit=limit
-                    )
-                )
+                r = await pending.popleft()
+                if not isinstance(r, raw.types.upload.File) or not r.bytes:
+                    break
+                yield r.bytes
+                if len(r.bytes) < chunk_size:
+                    # short chunk means end of file
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
 
-            return m_file
+    async def yield_file(self, media_msg: Message, offset: int, first_part_cut: int,
+                         last_part_cut: int, part_count: int, chunk_size: int):
+        current_part = 1
+        async for chunk in self.iter_chunks(media_msg, offset, chunk_size, part_count):
+            if part_count == 1:
+                yield chunk[first_part_cut:last_part_cut]
+            elif current_part == 1:
+                yield chunk[first_part_cut:]
+            elif current_part == part_count:
+                yield chunk[:last_part_cut]
+            else:
+                yield chunk
+            current_part += 1
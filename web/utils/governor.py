@@ -0,0 +1,98 @@
+import asyncio
+from collections import deque, OrderedDict
+from info import STREAM_LIMIT, STREAM_LIMIT_PER_IP, GETFILE_LIMIT, TRUSTED_PROXY_HOPS
+
+
+class StreamGovernor:
+    """Admission control for /download: global and per-IP open stream limits"""
+
+    def __init__(self, limit, per_ip):
+        self.limit = limit
+        self.per_ip = per_ip
+        self.active = 0
+        self.ips = {}
+
+    def acquire(self, ip):
+        if self.active >= self.limit or self.ips.get(ip, 0) >= self.per_ip:
+            return False
+        self.active += 1
+        self.ips[ip] = self.ips.get(ip, 0) + 1
+        return True
+
+    def release(self, ip):
+        self.active -= 1
+        left = self.ips.get(ip, 1) - 1
+        if left:
+            self.ips[ip] = left
+        else:
+            self.ips.pop(ip, None)
+
+
+class FairScheduler:
+    """
+    Caps concurrent GetFile calls of one client and hands free slots
+    to the waiting streams in round-robin order, so a download manager
+    with many parts can't starve a single viewer.
+    """
+
+    def __init__(self, slots):
+        self.free = slots
+        # stream id -> waiting futures of that stream
+        self.queues = OrderedDict()
+
+    async def acquire(self, stream_id):
+        if self.free > 0 and not self.queues:
+            self.free -= 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(stream_id, deque()).append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # slot was granted right before cancel, pass it on
+                self.release()
+            raise
+
+    def release(self):
+        while self.queues:
+            stream_id, waiters = next(iter(self.queues.items()))
+            fut = waiters.popleft()
+            if waiters:
+                self.queues.move_to_end(stream_id)
+            else:
+                del self.queues[stream_id]
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.free += 1
+
+
+governor = StreamGovernor(STREAM_LIMIT, STREAM_LIMIT_PER_IP)
+
+# client name -> FairScheduler
+schedulers = {}
+
+
+def get_scheduler(client):
+    scheduler = schedulers.get(client.name)
+    if scheduler is None:
+        scheduler = schedulers[client.name] = FairScheduler(GETFILE_LIMIT)
+    return scheduler
+
+
+def client_ip(request):
+    """
+    Real viewer IP (Koyeb / Heroku put us behind a proxy).
+    Only the entries appended by our TRUSTED_PROXY_HOPS proxies are
+    trusted, counted from the right; anything further left is whatever
+    the client sent and would let it dodge STREAM_LIMIT_PER_IP.
+    """
+    forwarded = request.headers.get("X-Forwarded-For")
+    if not forwarded or TRUSTED_PROXY_HOPS <= 0:
+        return request.remote
+    addresses = [a.strip() for a in forwarded.split(",") if a.strip()]
+    if not addresses:
+        return request.remote
+    return addresses[-min(TRUSTED_PROXY_HOPS, len(addresses))]
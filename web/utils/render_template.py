@@ -1,8 +1,11 @@
-from info import BIN_CHANNEL, URL
-from utils import temp
-from web.utils.custom_dl import TGCustomYield
+import re
+import html
+import hashlib
 import urllib.parse
-import aiofiles, html
+from collections import OrderedDict
+from info import URL, WATCH_CACHE_SIZE
+from web.utils.clients import get_media_message
+from web.utils.static_files import asset_url
 
 
 # styles from deepseek.com
@@ -15,150 +18,8 @@ watch_tmplt = """
     <meta http-equiv="X-UA-Compatible" content="IE=edge">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>{heading}</title>
-    <link rel="stylesheet" href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap">
-    <link rel="stylesheet" href="https://cdn.plyr.io/3.7.8/plyr.css" />
-    <style>
-        :root {
-            --primary: #818cf8;
-            --primary-hover: #6366f1;
-            --text-primary: #f8fafc;
-            --text-secondary: #94a3b8;
-            --bg-color: #0f172a;
-            --player-bg: #1e293b;
-            --footer-bg: #1e293b;
-            --border-color: #334155;
-        }
-        
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        
-        body {
-            font-family: 'Inter', sans-serif;
-            background-color: var(--bg-color);
-            color: var(--text-primary);
-            min-height: 100vh;
-            display: flex;
-            flex-direction: column;
-        }
-        
-        header {
-            padding: 1rem;
-            background-color: var(--player-bg);
-            box-shadow: 0 1px 3px rgba(0, 0, 0, 0.1);
-            position: sticky;
-            top: 0;
-            z-index: 10;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-        }
-        
-        #file-name {
-            font-size: 1.1rem;
-            font-weight: 600;
-            color: var(--text-primary);
-            white-space: nowrap;
-            overflow: hidden;
-            text-overflow: ellipsis;
-            max-width: 80%;
-            text-align: center;
-        }
-        
-        .container {
-            flex: 1;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            padding: 2rem;
-            width: 100%;
-        }
-        
-        .player-container {
-            width: 100%;
-            max-width: 1200px;
-            background-color: var(--player-bg);
-            border-radius: 0.5rem;
-            overflow: hidden;
-            box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1), 0 2px 4px -1px rgba(0, 0, 0, 0.06);
-        }
-        
-        .action-buttons {
-            display: flex;
-            justify-content: center;
-            gap: 1rem;
-            margin-top: 1rem;
-            padding: 0 1rem;
-        }
-        
-        .action-btn {
-            background-color: var(--primary);
-            color: white;
-            border: none;
-            padding: 0.5rem 1rem;
-            border-radius: 0.25rem;
-            font-weight: 500;
-            cursor: pointer;
-            display: flex;
-            align-items: center;
-            gap: 0.5rem;
-            text-decoration: none;
-            transition: background-color 0.2s;
-        }
-        
-        .action-btn:hover {
-            background-color: var(--primary-hover);
-        }
-        
-        footer {
-            padding: 1rem;
-            text-align: center;
-            background-color: var(--footer-bg);
-            color: var(--text-secondary);
-            font-size: 0.875rem;
-            border-top: 1px solid var(--border-color);
-        }
-        
-        @media (max-width: 768px) {
-            #file-name {
-                font-size: 0.9rem;
-                max-width: 90%;
-            }
-            
-            .container {
-                padding: 1rem;
-            }
-            
-            .action-buttons {
-                flex-direction: column;
-                gap: 0.5rem;
-            }
-        }
-        
-        /* Plyr overrides */
-        .plyr--video .plyr__control--overlaid {
-            background: var(--primary);
-        }
-        
-        .plyr--video .plyr__control:hover, 
-        .plyr--video .plyr__control[aria-expanded="true"] {
-            background: var(--primary-hover);
-        }
-        
-        .plyr__control.plyr__tab-focus {
-            box-shadow: 0 0 0 5px rgba(99, 102, 241, 0.5);
-        }
-        
-        .plyr--full-ui input[type="range"] {
-            color: var(--primary);
-        }
-        
-        .plyr__menu__container .plyr__control[role="menuitemradio"][aria-checked="true"]::before {
-            background: var(--primary);
-        }
-    </style>
+    <link rel="stylesheet" href="{plyr_css}" />
+    <link rel="stylesheet" href="{watch_css}" />
 </head>
 <body class="dark">
     <header>
@@ -191,7 +52,7 @@ watch_tmplt = """
         <p>Video not playing? Your browser might not support the codec. Please try downloading the file or playing in VLC.</p>
     </footer>
 
-    <script src="https://cdn.plyr.io/3.7.8/plyr.js"></script>
+    <script src="{plyr_js}"></script>
     <script>
         document.addEventListener('DOMContentLoaded', () => {
             // Initialize Plyr player
@@ -211,6 +72,7 @@ watch_tmplt = """
                     'fullscreen'
                 ],
                 settings: ['captions', 'quality', 'speed'],
+                iconUrl: '{plyr_svg}',
                 hideControls: false
             });
         });
@@ -219,14 +81,70 @@ watch_tmplt = """
 </html>
 """
 
+# Asset links never change at runtime, bake them in once
+for _name, _url in (
+    ("{plyr_css}", asset_url("plyr.css")),
+    ("{plyr_js}", asset_url("plyr.js")),
+    ("{plyr_svg}", asset_url("plyr.svg")),
+    ("{watch_css}", asset_url("watch.css"))
+):
+    watch_tmplt = watch_tmplt.replace(_name, _url)
+
+
+def compile_template(template):
+    """Split a template once into literal text and placeholder names"""
+    # even indexes are literals, odd indexes are placeholder names
+    return re.split(r"\{(heading|file_name|src)\}", template)
+
+
+WATCH_PARTS = compile_template(watch_tmplt)
+
+# part of the page ETag, so a new template or asset version is not a 304
+TEMPLATE_VERSION = hashlib.sha1(watch_tmplt.encode()).hexdigest()[:12]
+
+
+def render(parts, values):
+    return "".join(
+        part if i % 2 == 0 else values[part]
+        for i, part in enumerate(parts)
+    )
+
+
+class WatchPage:
+    __slots__ = ("html", "etag", "last_modified")
+
+    def __init__(self, html_, etag, last_modified):
+        self.html = html_
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+# message_id -> WatchPage (BIN_CHANNEL copies never change)
+PAGES = OrderedDict()
+
+
 async def media_watch(message_id):
-    media_msg = await temp.BOT.get_messages(BIN_CHANNEL, message_id)
+    page = PAGES.get(message_id)
+    if page:
+        PAGES.move_to_end(message_id)
+        return page
+
+    _, _, media_msg = await get_media_message(message_id)
     media = getattr(media_msg, media_msg.media.value, None)
     src = urllib.parse.urljoin(URL, f'download/{message_id}')
     tag = media.mime_type.split('/')[0].strip()
     if tag == 'video':
-        heading = html.escape(f'Watch - {media.file_name}')
-        html_ = watch_tmplt.replace('{heading}', heading).replace('{file_name}', media.file_name).replace('{src}', src)
+        file_name = html.escape(media.file_name or '')
+        html_ = render(WATCH_PARTS, {
+            'heading': f'Watch - {file_name}',
+            'file_name': file_name,
+            'src': src
+        })
     else:
         html_ = '<h1>This is not streamable file</h1>'
-    return html_
+
+    page = WatchPage(html_, f'"{media.file_unique_id}-{TEMPLATE_VERSION}"', media_msg.date)
+    PAGES[message_id] = page
+    if len(PAGES) > WATCH_CACHE_SIZE:
+        PAGES.popitem(last=False)
+    return page
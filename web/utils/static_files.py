@@ -0,0 +1,88 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
+
+# Optional vendored assets (see Dockerfile), served from the CDN when missing
+CDN_FALLBACK = {
+    "plyr.css": "https://cdn.plyr.io/3.7.8/plyr.css",
+    "plyr.js": "https://cdn.plyr.io/3.7.8/plyr.js",
+    "plyr.svg": "https://cdn.plyr.io/3.7.8/plyr.svg"
+}
+
+COMPRESSIBLE = ("text/", "application/javascript", "image/svg+xml", "application/json")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class StaticFile:
+    """A static asset kept in memory with its gzip / brotli variants"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()[:16]
+        self.version = digest
+        self.etag = f'"{digest}"'
+        self.mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.variants = {"identity": data}
+
+        if self.mime.startswith(COMPRESSIBLE):
+            self.variants["gzip"] = gzip.compress(data, compresslevel=9, mtime=0)
+            if brotli:
+                self.variants["br"] = brotli.compress(data, quality=11)
+
+    def pick(self, accept_encoding):
+        accepted = {e.split(";")[0].strip() for e in accept_encoding.split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.variants:
+                return encoding, self.variants[encoding]
+        return "identity", self.variants["identity"]
+
+
+def load_assets():
+    assets = {}
+    if not os.path.isdir(STATIC_DIR):
+        return assets
+    for name in os.listdir(STATIC_DIR):
+        path = os.path.join(STATIC_DIR, name)
+        if os.path.isfile(path):
+            assets[name] = StaticFile(path)
+    return assets
+
+
+ASSETS = load_assets()
+
+
+def asset_url(name):
+    """Versioned URL of a local asset (safe to cache forever)"""
+    asset = ASSETS.get(name)
+    if asset:
+        return f"/static/{name}?v={asset.version}"
+    return CDN_FALLBACK.get(name, "")
+
+
+async def static_handler(request):
+    asset = ASSETS.get(request.match_info["name"])
+    if not asset:
+        raise web.HTTPNotFound()
+
+    headers = {
+        "ETag": asset.etag,
+        "Cache-Control": IMMUTABLE,
+        "Vary": "Accept-Encoding"
+    }
+    if request.headers.get("If-None-Match") == asset.etag:
+        return web.Response(status=304, headers=headers)
+
+    encoding, body = asset.pick(request.headers.get("Accept-Encoding", ""))
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return web.Response(body=body, content_type=asset.mime, headers=headers)